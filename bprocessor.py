@@ -1,5 +1,6 @@
 
 import io
+import mmap
 import struct
 from collections import deque
 from enum import Enum, auto
@@ -8,6 +9,9 @@ from tempfile import TemporaryFile
 from btypes import BinaryRecordType, FutureRecordType, AlternateContentRecordType
 
 
+record_types = dict((member.value, member) for member in BinaryRecordType)
+
+
 # Exceptions
 class UnexpectedEOFException(Exception):
     pass
@@ -51,20 +55,20 @@ class RecordDescriptor:
             rprocessor.write(0x80 | d[0])
             rprocessor.write((d[1] << 1) | ((d[0] & 0x80) >> 7))
         
-        dsize = struct.pack('<I', self.size)
-        count = 0
-        for i, val in enumerate(dsize):
-            if val != 0:
-                count = i
-        
-        for i in range(count + 1):
-            o = dsize[i] if i == 0 else ((dsize[i] << 1) | ((dsize[i - 1] & 0x80) >> 7))
-            rprocessor.write((0x80 | o) if i < count - 1 else (o & 0x7f))
+        size = self.size
+        if not 0 <= size < 0x10000000:
+            raise ValueError(f'Record size must be between 0 and {0x0fffffff}: {size}')
+        while True:
+            d = size & 0x7f
+            size >>= 7
+            if not size:
+                rprocessor.write(d)
+                break
+            rprocessor.write(0x80 | d)
     
     def skip(self, target, repository=None):
         if repository and repository.for_update:
-            data = target.read(self.size, single_as_int=False)
-            repository.store(self, data)
+            repository.skip(self, target)
         else:
             target.seek(self.size, io.SEEK_CUR)
 
@@ -112,6 +116,22 @@ class RecordProcessor:
         self.stream = stream
         self.read_stack = deque()
         self.single_buf = bytearray(1)
+        # mmap objects have read() but no readinto().
+        self.readinto = getattr(stream, 'readinto', None)
+    
+    def save_state(self):
+        # The read stack packed two bits per level, innermost in the high bits, for resuming a read at a saved offset.
+        code = 0
+        for state in reversed(self.read_stack):
+            code = (code << 2) | state.value
+        return code
+    
+    def restore_state(self, code):
+        stack = self.read_stack
+        stack.clear()
+        while code:
+            stack.append(RecordReadState(code & 3))
+            code >>= 2
     
     def skip_until(self, *until_lst, repository=None, skip_last=False):
         while True:
@@ -132,6 +152,22 @@ class RecordProcessor:
             r.skip(self, repository)
         return r
     
+    def scan(self, *rtypes):
+        stream = self.stream
+        while True:
+            offset = stream.tell()
+            try:
+                r = self.read_descriptor()
+            except UnexpectedEOFException:
+                return
+            
+            data_offset = stream.tell()
+            if r.rtype in rtypes:
+                yield offset, r
+                stream.seek(data_offset + r.size)
+            else:
+                stream.seek(r.size, io.SEEK_CUR)
+    
     def read_descriptor(self):
         stack = self.read_stack
         
@@ -140,19 +176,15 @@ class RecordProcessor:
         rtype_num = (((self.read(1) & 0x7f) << 7) | d & 0x7f) if d & 0x80 else d & 0x7f
         
         # Determine Type
-        if not len(stack):
-            rtype = BinaryRecordType(rtype_num)
-        else:
-            try:
+        rtype = record_types.get(rtype_num)
+        if rtype is None:
+            state = stack[-1] if len(stack) else None
+            if state == RecordReadState.FUTURE_RECORD:
+                rtype = FutureRecordType(rtype_num)
+            elif state == RecordReadState.ALT_CONTENT:
+                rtype = AlternateContentRecordType(rtype_num)
+            else:
                 rtype = BinaryRecordType(rtype_num)
-            except ValueError:
-                state = stack[-1]
-                if state == RecordReadState.FUTURE_RECORD:
-                    rtype = FutureRecordType(rtype_num)
-                elif state == RecordReadState.ALT_CONTENT:
-                    rtype = AlternateContentRecordType(rtype_num)
-                else:
-                    raise ValueError(rtype_num)
         
         # Evaluate State
         if rtype == BinaryRecordType.BrtFRTBegin:
@@ -175,14 +207,14 @@ class RecordProcessor:
         return RecordDescriptor(rtype, size)
     
     def read_xl_w_string(self, nullable=True):
-        cch_characters = self.read(4)
+        cch_characters = struct.unpack('<I', self.read(4))[0]
         if cch_characters == 0xffffffff:
             if nullable:
                 return None
             else:
                 raise ValueError(f'Character length must be less than {0xffffffff}.')
         
-        cch_len = struct.unpack('<I', cch_characters)[0] * 2
+        cch_len = cch_characters * 2
         rgch_data = self.read(cch_len).decode('utf-16le')
         
         return rgch_data
@@ -208,11 +240,16 @@ class RecordProcessor:
         
         stream = self.stream
         if size == 1 and single_as_int:
-            single_buf = self.single_buf
-            ct = stream.readinto(single_buf)
-            if ct == 0:
+            readinto = self.readinto
+            if readinto:
+                single_buf = self.single_buf
+                if readinto(single_buf) == 0:
+                    raise UnexpectedEOFException()
+                return single_buf[0]
+            d = stream.read(1)
+            if not d:
                 raise UnexpectedEOFException()
-            return single_buf[0]
+            return d[0]
         else:
             return stream.read(size)
     
@@ -225,8 +262,43 @@ class RecordProcessor:
         else:
             stream.write(data)
     
+    def write_span(self, source, start, end):
+        stream = self.stream
+        if isinstance(stream, SpanWriter):
+            stream.write_span(source, start, end)
+        else:
+            stream.write(source[start:end])
+    
     def seek(self, n, whence=io.SEEK_SET):
         self.stream.seek(n, whence)
+
+
+class SpanWriter:
+    def __init__(self, stream):
+        self.stream = stream
+        self.source = None
+        self.start = 0
+        self.end = 0
+    
+    def write_span(self, source, start, end):
+        # Slices that continue the pending one from the same source are merged into a single write.
+        if source is self.source and start == self.end:
+            self.end = end
+            return
+        self.flush()
+        self.source = source
+        self.start = start
+        self.end = end
+    
+    def write(self, data):
+        self.flush()
+        return self.stream.write(data)
+    
+    def flush(self):
+        source = self.source
+        if source is not None:
+            self.stream.write(source[self.start:self.end])
+            self.source = None
     
 
 
@@ -245,22 +317,128 @@ class RecordCopy:
     def __len__(self):
         return self.data_len
 
+class RecordSpan:
+    def __init__(self, descriptor, source, offset, data_len):
+        self.descriptor = descriptor
+        self.source = source
+        self.offset = offset
+        self.data_len = data_len
+    
+    def write_to(self, stream):
+        self.descriptor.write(stream)
+        if self.data_len:
+            stream.write(self.source[self.offset:self.offset + self.data_len])
+    
+    def __len__(self):
+        return self.data_len
+
+class RawSpan:
+    def __init__(self, source, start, end, data_len):
+        self.source = source
+        self.start = start
+        self.end = end
+        self.data_len = data_len
+    
+    def write_to(self, stream):
+        RecordProcessor.resolve(stream).write_span(self.source, self.start, self.end)
+    
+    def __len__(self):
+        return self.data_len
+
 class RecordRepository:
+    
+    @staticmethod
+    def resolve_source(stream):
+        if isinstance(stream, io.BytesIO):
+            # getvalue() shares the initial bytes object rather than copying it, and unlike getbuffer() doesn't pin the stream open.
+            return memoryview(stream.getvalue())
+        elif isinstance(stream, mmap.mmap):
+            return stream
+        return None
+    
+    @staticmethod
+    def find_header(source, data_offset, descriptor):
+        # Locates the source bytes of an already-read descriptor, assuming the canonical (shortest) encoding, and checks them.
+        rtype = descriptor.rtype.value
+        size = descriptor.size
+        header_len = (1 if rtype <= 0x7f else 2) + max(1, (size.bit_length() + 6) // 7)
+        start = data_offset - header_len
+        if start < 0:
+            return None
+        
+        header = source[start:data_offset]
+        i = 1
+        rtype_num = header[0] & 0x7f
+        if header[0] & 0x80:
+            rtype_num |= (header[1] & 0x7f) << 7
+            i = 2
+        size_num = 0
+        for j in range(i, header_len):
+            size_num |= (header[j] & 0x7f) << (7 * (j - i))
+        
+        if rtype_num != rtype or size_num != size or header[-1] & 0x80:
+            return None
+        return start
+    
+    
     def __init__(self, for_update):
         self.for_update = for_update
         if for_update:
             self.queue = deque()
             self.current = []
-            self.f = TemporaryFile()
+            self.f = None
+            self.source_stream = None
+            self.source = None
     
     def store(self, descriptor, data):
         if not self.for_update:
             return
         f = self.f
+        if f is None:
+            f = self.f = TemporaryFile()
         if data:
             f.write(data)
         self.current.append(RecordCopy(descriptor, len(data), f))
     
+    def source_for(self, target):
+        if not self.for_update:
+            return None
+        stream = RecordProcessor.resolve(target).stream
+        if self.source_stream is None:
+            self.source_stream = stream
+            self.source = RecordRepository.resolve_source(stream)
+        return self.source if stream is self.source_stream else None
+    
+    def skip(self, descriptor, target):
+        if not self.for_update:
+            return
+        rprocessor = RecordProcessor.resolve(target)
+        stream = rprocessor.stream
+        
+        # Streaming sources (and any stream other than the first one seen) fall back to copying through the temp file.
+        source = self.source_for(rprocessor)
+        if source is None:
+            self.store(descriptor, rprocessor.read(descriptor.size, single_as_int=False))
+            return
+        
+        size = descriptor.size
+        offset = stream.tell()
+        stream.seek(size, io.SEEK_CUR)
+        
+        current = self.current
+        start = RecordRepository.find_header(source, offset, descriptor)
+        if start is None:
+            current.append(RecordSpan(descriptor, source, offset, size))
+            return
+        
+        # Adjacent skipped records are passed through as one contiguous slice of the source.
+        last = current[-1] if current else None
+        if isinstance(last, RawSpan) and last.end == start:
+            last.end = offset + size
+            last.data_len += size
+        else:
+            current.append(RawSpan(source, start, offset + size, size))
+    
     def push_current(self):
         if not self.for_update:
             return
@@ -268,7 +446,7 @@ class RecordRepository:
         self.current = []
     
     def begin_write(self):
-        if not self.for_update:
+        if not self.for_update or self.f is None:
             return
         self.f.seek(0)
     
@@ -278,10 +456,22 @@ class RecordRepository:
         for item in self.queue.popleft():
             item.write_to(stream)
     
+    def drop_poll(self, count):
+        if not self.for_update:
+            return
+        queue = self.queue
+        for i in range(count):
+            for item in queue.popleft():
+                # Keep the temp file positioned for the copies that follow.
+                if isinstance(item, RecordCopy) and item.data_len:
+                    item.data_file.seek(item.data_len, io.SEEK_CUR)
+    
     def close(self):    
         if not self.for_update:
             return
-        self.f.close()
+        if self.f is not None:
+            self.f.close()
+        self.source = None
     
     def __len__(self):
         if not self.for_update:
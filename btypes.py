@@ -980,6 +980,21 @@ class ColorType(Enum):
     RGBA = 0x02
     THEME = 0x03
 
+# Packed 0xRRGGBBAA values indexed by PaletteColor value; None for system colors.
+palette_rgba = (
+    0x000000FF, 0xFFFFFFFF, 0xFF0000FF, 0x00FF00FF, 0x0000FFFF, 0xFFFF00FF, 0xFF00FFFF, 0x00FFFFFF,
+    0x000000FF, 0xFFFFFFFF, 0xFF0000FF, 0x00FF00FF, 0x0000FFFF, 0xFFFF00FF, 0xFF00FFFF, 0x00FFFFFF,
+    0x800000FF, 0x008000FF, 0x000080FF, 0x808000FF, 0x800080FF, 0x008080FF, 0xC0C0C0FF, 0x808080FF,
+    0x9999FFFF, 0x993366FF, 0xFFFFCCFF, 0xCCFFFFFF, 0x660066FF, 0xFF8080FF, 0x0066CCFF, 0xCCCCFFFF,
+    0x000080FF, 0xFF00FFFF, 0xFFFF00FF, 0x00FFFFFF, 0x800080FF, 0x800000FF, 0x008080FF, 0x0000FFFF,
+    0x00CCFFFF, 0xCCFFFFFF, 0xCCFFCCFF, 0xFFFF99FF, 0x99CCFFFF, 0xFF99CCFF, 0xCC99FFFF, 0xFFCC99FF,
+    0x3366FFFF, 0x33CCCCFF, 0x99CC00FF, 0xFFCC00FF, 0xFF9900FF, 0xFF6600FF, 0x666699FF, 0x969696FF,
+    0x003366FF, 0x339966FF, 0x003300FF, 0x333300FF, 0x993300FF, 0x993366FF, 0x333399FF, 0x333333FF,
+    None, None, None, None, None, None, None, None,
+    None, None, None, None, None, None, None, 0x000000FF,
+    None, None,
+)
+
 class PaletteColor(Enum):
     icvBlack = 0x00         # 0x000000FF
     icvWhite = 0x01         # 0xFFFFFFFF
@@ -1065,73 +1080,9 @@ class PaletteColor(Enum):
     icvInfoText = 0x51      # System text color for tooltip controls.
     
     def get_rgba(self):
-        if self == PaletteColor.icvBlack: return 0x000000FF
-        elif self == PaletteColor.icvWhite: return 0xFFFFFFFF
-        elif self == PaletteColor.icvRed: return 0xFF0000FF
-        elif self == PaletteColor.icvGreen: return 0x00FF00FF
-        elif self == PaletteColor.icvBlue: return 0x0000FFFF
-        elif self == PaletteColor.icvYellow: return 0xFFFF00FF
-        elif self == PaletteColor.icvMagenta: return 0xFF00FFFF
-        elif self == PaletteColor.icvCyan: return 0x00FFFFFF
-        elif self == PaletteColor.icvPlt1: return 0x000000FF
-        elif self == PaletteColor.icvPlt2: return 0xFFFFFFFF
-        elif self == PaletteColor.icvPlt3: return 0xFF0000FF
-        elif self == PaletteColor.icvPlt4: return 0x00FF00FF
-        elif self == PaletteColor.icvPlt5: return 0x0000FFFF
-        elif self == PaletteColor.icvPlt6: return 0xFFFF00FF
-        elif self == PaletteColor.icvPlt7: return 0xFF00FFFF
-        elif self == PaletteColor.icvPlt8: return 0x00FFFFFF
-        elif self == PaletteColor.icvPlt9: return 0x800000FF
-        elif self == PaletteColor.icvPlt10: return 0x008000FF
-        elif self == PaletteColor.icvPlt11: return 0x000080FF
-        elif self == PaletteColor.icvPlt12: return 0x808000FF
-        elif self == PaletteColor.icvPlt13: return 0x800080FF
-        elif self == PaletteColor.icvPlt14: return 0x008080FF
-        elif self == PaletteColor.icvPlt15: return 0xC0C0C0FF
-        elif self == PaletteColor.icvPlt16: return 0x808080FF
-        elif self == PaletteColor.icvPlt17: return 0x9999FFFF
-        elif self == PaletteColor.icvPlt18: return 0x993366FF
-        elif self == PaletteColor.icvPlt19: return 0xFFFFCCFF
-        elif self == PaletteColor.icvPlt20: return 0xCCFFFFFF
-        elif self == PaletteColor.icvPlt21: return 0x660066FF
-        elif self == PaletteColor.icvPlt22: return 0xFF8080FF
-        elif self == PaletteColor.icvPlt23: return 0x0066CCFF
-        elif self == PaletteColor.icvPlt24: return 0xCCCCFFFF
-        elif self == PaletteColor.icvPlt25: return 0x000080FF
-        elif self == PaletteColor.icvPlt26: return 0xFF00FFFF
-        elif self == PaletteColor.icvPlt27: return 0xFFFF00FF
-        elif self == PaletteColor.icvPlt28: return 0x00FFFFFF
-        elif self == PaletteColor.icvPlt29: return 0x800080FF
-        elif self == PaletteColor.icvPlt30: return 0x800000FF
-        elif self == PaletteColor.icvPlt31: return 0x008080FF
-        elif self == PaletteColor.icvPlt32: return 0x0000FFFF
-        elif self == PaletteColor.icvPlt33: return 0x00CCFFFF
-        elif self == PaletteColor.icvPlt34: return 0xCCFFFFFF
-        elif self == PaletteColor.icvPlt35: return 0xCCFFCCFF
-        elif self == PaletteColor.icvPlt36: return 0xFFFF99FF
-        elif self == PaletteColor.icvPlt37: return 0x99CCFFFF
-        elif self == PaletteColor.icvPlt38: return 0xFF99CCFF
-        elif self == PaletteColor.icvPlt39: return 0xCC99FFFF
-        elif self == PaletteColor.icvPlt40: return 0xFFCC99FF
-        elif self == PaletteColor.icvPlt41: return 0x3366FFFF
-        elif self == PaletteColor.icvPlt42: return 0x33CCCCFF
-        elif self == PaletteColor.icvPlt43: return 0x99CC00FF
-        elif self == PaletteColor.icvPlt44: return 0xFFCC00FF
-        elif self == PaletteColor.icvPlt45: return 0xFF9900FF
-        elif self == PaletteColor.icvPlt46: return 0xFF6600FF
-        elif self == PaletteColor.icvPlt47: return 0x666699FF
-        elif self == PaletteColor.icvPlt48: return 0x969696FF
-        elif self == PaletteColor.icvPlt49: return 0x003366FF
-        elif self == PaletteColor.icvPlt50: return 0x339966FF
-        elif self == PaletteColor.icvPlt51: return 0x003300FF
-        elif self == PaletteColor.icvPlt52: return 0x333300FF
-        elif self == PaletteColor.icvPlt53: return 0x993300FF
-        elif self == PaletteColor.icvPlt54: return 0x993366FF
-        elif self == PaletteColor.icvPlt55: return 0x333399FF
-        elif self == PaletteColor.icvPlt56: return 0x333333FF
-        elif self == PaletteColor.icvCrtNeutral: return 0x000000FF
-        else: return None
+        return palette_rgba[self.value]
 
+# Named as in [MS-XLSB]; Excel applies 0/1 and 2/3 the other way round, see ThemePart.scheme_slots.
 class ThemeColor(Enum):
     DK_1 = 0x00
     LT_1 = 0x01
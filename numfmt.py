@@ -0,0 +1,226 @@
+
+from enum import Enum
+from functools import lru_cache
+from collections import namedtuple
+
+
+class FormatKind(Enum):
+    GENERAL = 0
+    NUMBER = 1
+    PERCENT = 2
+    SCIENTIFIC = 3
+    FRACTION = 4
+    DATE = 5
+    TIME = 6
+    DATETIME = 7
+    DURATION = 8
+    TEXT = 9
+
+temporal_kinds = frozenset((FormatKind.DATE, FormatKind.TIME, FormatKind.DATETIME, FormatKind.DURATION))
+
+# Built-in ids whose format strings depend on the locale; en-US stand-ins that classify the same way.
+implied_formats = {
+    5: '$#,##0_);($#,##0)'
+    , 6: '$#,##0_);[Red]($#,##0)'
+    , 7: '$#,##0.00_);($#,##0.00)'
+    , 8: '$#,##0.00_);[Red]($#,##0.00)'
+    , 27: 'yyyy/m/d'
+    , 28: 'yyyy/m/d'
+    , 29: 'yyyy/m/d'
+    , 30: 'm/d/yy'
+    , 31: 'yyyy/m/d'
+    , 32: 'h:mm'
+    , 33: 'h:mm:ss'
+    , 34: 'h:mm AM/PM'
+    , 35: 'h:mm:ss AM/PM'
+    , 36: 'yyyy/m/d'
+    , 41: '_(* #,##0_);_(* (#,##0);_(* "-"_);_(@_)'
+    , 42: '_($* #,##0_);_($* (#,##0);_($* "-"_);_(@_)'
+    , 43: '_(* #,##0.00_);_(* (#,##0.00);_(* "-"??_);_(@_)'
+    , 44: '_($* #,##0.00_);_($* (#,##0.00);_($* "-"??_);_(@_)'
+    , 50: 'yyyy/m/d'
+    , 51: 'yyyy/m/d'
+    , 52: 'yyyy/m/d'
+    , 53: 'yyyy/m/d'
+    , 54: 'yyyy/m/d'
+    , 55: 'h:mm AM/PM'
+    , 56: 'h:mm:ss AM/PM'
+    , 57: 'yyyy/m/d'
+    , 58: 'yyyy/m/d'
+}
+
+
+class FormatSection(namedtuple('FormatSection', ('kind', 'decimals', 'color', 'condition'))):
+    __slots__ = ()
+
+
+class NumberFormatInfo(namedtuple('NumberFormatInfo', ('format_str', 'kind', 'decimals', 'sections'))):
+    __slots__ = ()
+    
+    @property
+    def is_temporal(self):
+        return self.kind in temporal_kinds
+    
+    @property
+    def is_date(self):
+        return self.kind == FormatKind.DATE or self.kind == FormatKind.DATETIME
+    
+    @property
+    def is_text(self):
+        return self.kind == FormatKind.TEXT
+
+
+def split_sections(format_str):
+    sections = []
+    start = i = 0
+    n = len(format_str)
+    while i < n:
+        c = format_str[i]
+        if c == '"':
+            end = format_str.find('"', i + 1)
+            i = n if end < 0 else end + 1
+            continue
+        if c == '[':
+            end = format_str.find(']', i + 1)
+            i = n if end < 0 else end + 1
+            continue
+        if c in '\\_*':
+            i += 2
+            continue
+        if c == ';':
+            sections.append(format_str[start:i])
+            start = i + 1
+        i += 1
+    sections.append(format_str[start:])
+    return sections
+
+def parse_section(section):
+    tokens = []
+    color = condition = None
+    general = digits = percent = scientific = fraction = text = elapsed = ampm = False
+    decimals = 0
+    in_decimals = False
+    
+    i = 0
+    n = len(section)
+    while i < n:
+        c = section[i]
+        lower = c.lower()
+        
+        # Literals and padding
+        if c == '"':
+            end = section.find('"', i + 1)
+            i = n if end < 0 else end + 1
+            continue
+        if c in '\\_*':
+            i += 2
+            continue
+        
+        # Colors, conditions, locales and elapsed time
+        if c == '[':
+            end = section.find(']', i + 1)
+            if end < 0:
+                end = n
+            body = section[i + 1:end]
+            i = end + 1
+            
+            body_lower = body.lower()
+            if body_lower and body_lower[0] in 'hms' and not body_lower.strip(body_lower[0]):
+                elapsed = True
+                tokens.append('M' if body_lower[0] == 'm' else body_lower[0])
+            elif body_lower[:1] in ('<', '>', '='):
+                condition = body
+            elif not body_lower.startswith('$'):
+                color = body
+            continue
+        
+        if lower == 'g' and section[i:i + 7].lower() == 'general':
+            general = True
+            i += 7
+            continue
+        if lower == 'a' and section[i:i + 5].upper() == 'AM/PM':
+            ampm = True
+            i += 5
+            continue
+        if lower == 'a' and section[i:i + 3].upper() == 'A/P':
+            ampm = True
+            i += 3
+            continue
+        
+        # Exponent (E+/E-) or era year (e)
+        if lower == 'e':
+            if section[i + 1:i + 2] in ('+', '-'):
+                scientific = True
+                in_decimals = False
+                i += 2
+                continue
+            if c == 'e':
+                lower = 'y'
+        
+        if lower in 'ymdhs':
+            # A run of the same letter is a single token
+            j = i + 1
+            while j < n and section[j].lower() == section[i].lower():
+                j += 1
+            tokens.append(lower)
+            i = j
+            continue
+        
+        if c in '0#?':
+            digits = True
+            if in_decimals:
+                decimals += 1
+        elif c == '.':
+            in_decimals = not scientific
+        elif c == '%':
+            percent = True
+        elif c == '@':
+            text = True
+        elif c == '/' and digits:
+            fraction = True
+        i += 1
+    
+    # 'm' is minutes when it follows an hour or precedes a second, months otherwise
+    has_date = False
+    has_time = ampm
+    for k, token in enumerate(tokens):
+        if token == 'm':
+            if (k > 0 and tokens[k - 1] == 'h') or (k + 1 < len(tokens) and tokens[k + 1] == 's'):
+                has_time = True
+            else:
+                has_date = True
+        elif token in ('y', 'd'):
+            has_date = True
+        else:
+            has_time = True
+    
+    if elapsed:
+        kind = FormatKind.DURATION
+    elif has_date and has_time:
+        kind = FormatKind.DATETIME
+    elif has_date:
+        kind = FormatKind.DATE
+    elif has_time:
+        kind = FormatKind.TIME
+    elif scientific:
+        kind = FormatKind.SCIENTIFIC
+    elif fraction:
+        kind = FormatKind.FRACTION
+    elif percent:
+        kind = FormatKind.PERCENT
+    elif digits:
+        kind = FormatKind.NUMBER
+    elif text:
+        kind = FormatKind.TEXT
+    elif general or not section.strip():
+        kind = FormatKind.GENERAL
+    else:
+        kind = FormatKind.NUMBER
+    
+    return FormatSection(kind, decimals, color, condition)
+
+@lru_cache(maxsize=1024)
+def parse_format(format_str):
+    sections = tuple(parse_section(section) for section in split_sections(format_str))
+    first = sections[0]
+    return NumberFormatInfo(format_str, first.kind, first.decimals, sections)
@@ -1,66 +1,272 @@
 
 import os
 import io
+import sys
+import copy
+import struct
+import shutil
 import zipfile
+import zlib
+import threading
 import xml.etree.ElementTree as ET
 
 from enum import Enum
-from tempfile import TemporaryDirectory
-from zipfile import ZipFile, ZIP_DEFLATED, ZipInfo
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory, mkstemp
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED, ZipInfo
 from collections import deque
 from datetime import datetime
 
 from btypes import RelationshipType, ContentType
 
 
-def rec_zip(fname, src_dir):
-    zf = ZipFile(fname, 'w', ZIP_DEFLATED, compresslevel=6)
+# ZipInfo.compress_level is public from 3.13; earlier versions only carry a per-member level privately.
+compress_level_attr = 'compress_level' if sys.version_info >= (3, 13) else '_compresslevel'
+
+# Local file header and flag layouts from the ZIP specification (APPNOTE 4.3.7, 4.4.4, 4.5.3).
+local_file_header = struct.Struct('<4s2B4HL2L2H')
+data_descriptor_flag = 0x08
+zip64_extra_id = 0x0001
+
+# ZipFile attributes raw member writes rely on; none of them are public API. When any is missing, members are
+# recompressed through ZipFile.open instead. The 'zr' mode of test.py checks both paths.
+zip_internals = ('fp', '_lock', 'filelist', 'NameToInfo', 'start_dir', '_didModify')
+
+
+def rec_zip(fname, src_dir, policy=None, content_type_of=None, workers=1):
+    if policy is None:
+        policy = CompressionPolicy()
+    
     ts = datetime.now()
     ts = (ts.year, ts.month, ts.day, ts.hour, ts.minute, ts.second)
     
     if not str(src_dir).endswith(os.sep):
         src_dir = str(src_dir) + os.sep
     
+    members = []
     def rec_helper(cur):
         for e in os.scandir(cur):
             if e.is_dir():
                 rec_helper(e)
             else:
-                with zf.open(ZipInfo(e.path.replace(str(src_dir), ''), ts), 'w') as dest, open(e, 'rb') as src:
-                    dest.write(src.read())
+                path = e.path.replace(str(src_dir), '').replace(os.sep, '/')
+                content_type = content_type_of(path) if content_type_of else None
+                members.append((policy.zip_info(path, content_type, ts), e.path))
     
     rec_helper(src_dir)
-    zf.close()
+    with ZipFile(fname, 'w', ZIP_DEFLATED, compresslevel=6) as zf:
+        zip_members(zf, members, workers)
+
+def zip_members(dest, members, workers=1, max_bytes=256 * 1024 * 1024):
+    # Members are (zinfo, source) where source is a file path to compress or a ZipFile to copy zinfo from verbatim.
+    if workers <= 1 or not supports_raw_members(dest):
+        for zinfo, src in members:
+            write_member(dest, zinfo, src)
+        return
+    
+    executor = ThreadPoolExecutor(workers)
+    pending = deque()
+    in_use = 0
     
+    def write_next():
+        nonlocal in_use
+        zinfo, src, size, future = pending.popleft()
+        if future is None:
+            write_member(dest, zinfo, src)
+        else:
+            write_raw_member(dest, zinfo, future.result())
+            in_use -= size
+    
+    try:
+        for zinfo, src in members:
+            if isinstance(src, ZipFile) or zinfo.compress_type not in (ZIP_STORED, ZIP_DEFLATED):
+                pending.append((zinfo, src, 0, None))
+                continue
+            
+            # Compressed output is held until its turn to be written, so cap the source bytes in flight. A member larger
+            # than the whole budget is streamed through ZipFile.open in its turn instead.
+            size = os.path.getsize(src)
+            if size > max_bytes:
+                pending.append((zinfo, src, 0, None))
+                continue
+            while pending and in_use + size > max_bytes:
+                write_next()
+            in_use += size
+            pending.append((zinfo, src, size, executor.submit(compress_member, zinfo, src)))
+        
+        while pending:
+            write_next()
+    finally:
+        executor.shutdown(True, cancel_futures=True)
 
-def norm_path(path, return_segs=False, return_path=True, leading_slash=True):
-    if not path:
+def compress_member(zinfo, src, chunk_size=1024 * 1024):
+    compressor = None
+    if zinfo.compress_type == ZIP_DEFLATED:
+        level = getattr(zinfo, compress_level_attr)
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    
+    chunks = []
+    file_size = 0
+    crc = 0
+    with open(src, 'rb') as f:
+        for data in iter(lambda: f.read(chunk_size), b''):
+            file_size += len(data)
+            crc = zlib.crc32(data, crc)
+            if compressor:
+                data = compressor.compress(data)
+            if data:
+                chunks.append(data)
+    if compressor:
+        chunks.append(compressor.flush())
+    
+    zinfo.file_size = file_size
+    zinfo.CRC = crc
+    zinfo.compress_size = sum(len(data) for data in chunks)
+    return chunks
+
+def write_member(dest, zinfo, src):
+    if isinstance(src, ZipFile):
+        copy_zip_member(src, dest, zinfo)
+    else:
+        zinfo.file_size = os.path.getsize(src)
+        with open(src, 'rb') as f, dest.open(zinfo, 'w') as dest_f:
+            shutil.copyfileobj(f, dest_f, 1024 * 1024)
+
+def copy_zip_member(src, dest, info, chunk_size=1024 * 1024):
+    if not (supports_raw_members(src) and supports_raw_members(dest)):
+        zinfo = ZipInfo(info.filename, info.date_time)
+        zinfo.compress_type = info.compress_type
+        zinfo.external_attr = info.external_attr
+        zinfo.file_size = info.file_size
+        with src.open(info) as src_f, dest.open(zinfo, 'w') as dest_f:
+            shutil.copyfileobj(src_f, dest_f, chunk_size)
+        return
+    
+    src_fp = src.fp
+    src_fp.seek(info.header_offset)
+    fheader = local_file_header.unpack(src_fp.read(local_file_header.size))
+    src_fp.seek(fheader[10] + fheader[11], io.SEEK_CUR)
+    
+    zinfo = copy.copy(info)
+    zinfo.flag_bits &= ~data_descriptor_flag
+    zinfo.extra = strip_zip64_extra(info.extra)
+    
+    def read_chunks():
+        remaining = zinfo.compress_size
+        while remaining:
+            data = src_fp.read(min(chunk_size, remaining))
+            if not data:
+                raise zipfile.BadZipFile(f'Truncated member: {info.filename}')
+            yield data
+            remaining -= len(data)
+    
+    write_raw_member(dest, zinfo, read_chunks())
+
+def strip_zip64_extra(extra):
+    # The ZIP64 field is rewritten from the member's sizes and offset when its header is written again.
+    fields = []
+    i = 0
+    while i + 4 <= len(extra):
+        header_id, size = struct.unpack_from('<HH', extra, i)
+        if header_id != zip64_extra_id:
+            fields.append(extra[i:i + 4 + size])
+        i += 4 + size
+    return b''.join(fields)
+
+def supports_raw_members(zf):
+    return all(hasattr(zf, name) for name in zip_internals)
+
+def write_raw_member(dest, zinfo, chunks):
+    # Writes already-compressed member data with CRC and sizes set on zinfo. This is the only place ZipFile internals are
+    # touched; callers check supports_raw_members() first and otherwise go through ZipFile.open.
+    if not zinfo.external_attr:
+        zinfo.external_attr = 0o600 << 16
+    
+    with dest._lock:
+        dest_fp = dest.fp
+        zinfo.header_offset = dest_fp.tell()
+        dest_fp.write(zinfo.FileHeader())
+        for data in chunks:
+            dest_fp.write(data)
+        
+        dest.filelist.append(zinfo)
+        dest.NameToInfo[zinfo.filename] = zinfo
+        dest.start_dir = dest_fp.tell()
+        dest._didModify = True
+    
+
+class PartName:
+    __slots__ = ('path', 'folded', 'zip_path', 'segs')
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def parse(path):
+        psegs = []
+        for seg in path.split('/'):
+            if not seg or seg == '.':
+                continue
+            elif seg == '..':
+                if psegs:
+                    psegs.pop()
+            else:
+                psegs.append(sys.intern(seg))
+        
+        zip_path = sys.intern('/'.join(psegs))
+        path = sys.intern(f'/{zip_path}')
+        return PartName(path, sys.intern(path.casefold()), zip_path, tuple(psegs))
+    
+    def __init__(self, path, folded, zip_path, segs):
+        self.path = path
+        self.folded = folded
+        self.zip_path = zip_path
+        self.segs = segs
+    
+    def __eq__(self, other):
+        return isinstance(other, PartName) and self.folded == other.folded
+    
+    def __hash__(self):
+        return hash(self.folded)
+    
+    def __str__(self):
+        return self.path
+
+
+def part_name(path):
+    if isinstance(path, PartName):
+        return path
+    elif not path:
         path = ''
     elif isinstance(path, PartRelationship):
         path = path.target
     elif isinstance(path, PartInfo):
         path = path.path
-    
-    psegs = deque()
-    for seg in path.split('/'):
-        if not seg or seg == '.':
-            continue
-        elif seg == '..':
-            if len(psegs):
-                psegs.pop()
-        else:
-            psegs.append(seg)
+    return PartName.parse(path)
+
+def norm_path(path, return_segs=False, return_path=True, leading_slash=True):
+    name = part_name(path)
     
     if return_segs and not return_path:
-        return psegs
+        return deque(name.segs)
     
-    path = f"/{'/'.join(psegs)}" if leading_slash else '/'.join(psegs)
+    path = name.path if leading_slash else name.zip_path
     
     if return_path and return_segs:
-        return path, psegs
+        return path, deque(name.segs)
     else:
         return path
 
+def rels_path(path):
+    psegs = norm_path(path, True, False)
+    
+    root = f"/{'/'.join(list(psegs)[:-1])}"
+    
+    if len(psegs):
+        psegs.insert(-1, '_rels')
+        psegs[-1] = f'{psegs[-1]}.rels'
+        return root, '/'.join(psegs)
+    return root, '_rels/.rels'
+
 
 class XMLNSName(Enum):
     RELATIONSHIPS = 'http://schemas.openxmlformats.org/package/2006/relationships'
@@ -136,48 +342,81 @@ class PartRelationshipsPart:
         return PartRelationship(el.get('Id'), RelationshipType.resolve(el.get('Type')), target, raw_target)
 
     
+    @staticmethod
+    def read_zip(zf, path=None):
+        root, rel_path = rels_path(path)
+        try:
+            f = zf.open(rel_path)
+        except KeyError:
+            return None
+        with f:
+            return PartRelationshipsPart(root, ET.parse(f))
+    
+    @staticmethod
+    def parse_rid(rid):
+        if rid and rid.startswith('rId') and rid[3:].isdigit():
+            return int(rid[3:])
+        return None
+    
+    
     def __init__(self, root, xtree, file_handle=None):
         self.root = root
         self.xtree = xtree
         self.file_handle = file_handle
+        
+        # Attribute value -> elements in document order, kept in step with the tree. Each value maps to a dict used as an
+        # ordered set, so removing one relationship from a value shared by thousands (a Type) doesn't scan the rest.
+        self.indexes = {'Id': {}, 'Type': {}, 'Target': {}}
+        for el in xtree.iterfind('.//Relationship', {'': XMLNSName.RELATIONSHIPS.value}):
+            self._index(el)
+        self.next_rid = 1
+        # Removed elements stay in the tree until it is next read or written; Element.remove scans its siblings.
+        self.removed = set()
     
     
     def get_rel(self, by_name, value):
         by_name, value = PartRelationshipsPart.resolve_query(by_name, value)
-        ns = {'': XMLNSName.RELATIONSHIPS.value}
         
-        el = self.xtree.find(f'.//Relationship[@{by_name}="{value}"]', ns)
-        if el is None:
+        els = self.indexes[by_name].get(value)
+        if not els:
             return None
         
-        return PartRelationshipsPart.resolve_rel(self.root, el)
+        return PartRelationshipsPart.resolve_rel(self.root, next(iter(els)))
     
     def remove_rel(self, by_name, value):
         by_name, value = PartRelationshipsPart.resolve_query(by_name, value)
-        ns = {'': XMLNSName.RELATIONSHIPS.value}
         
-        xtree = self.xtree
-        el = xtree.find(f'.//Relationship[@{by_name}="{value}"]', ns)
-        if el is not None:
-            xtree.getroot().remove(el)
-    
-    def add_rel(self, rtype, target, rid=None):
-        ns = {'': XMLNSName.RELATIONSHIPS.value}
+        els = self.indexes[by_name].get(value)
+        if not els:
+            return
         
-        xtree = self.xtree
+        el = next(iter(els))
+        self.removed.add(el)
+        for name, index in self.indexes.items():
+            key = el.get(name)
+            els = index[key]
+            del els[el]
+            if not els:
+                del index[key]
         
+        i = PartRelationshipsPart.parse_rid(el.get('Id'))
+        if i is not None and i < self.next_rid:
+            self.next_rid = i
+    
+    def add_rel(self, rtype, target, rid=None):
         if rid is None:
-            i = 1
-            while True:
-                if xtree.find(f'.//Relationship[@Id="rId{i}"]', ns) is None:
-                    break
+            ids = self.indexes['Id']
+            i = self.next_rid
+            while f'rId{i}' in ids:
                 i += 1
             rid = f'rId{i}'
+            self.next_rid = i + 1
         
         if hasattr(rtype, 'value'):
             rtype = rtype.value
         
-        ET.SubElement(xtree.getroot(), f'{{{XMLNSName.RELATIONSHIPS.value}}}Relationship', {'Id': rid, 'Type': rtype, 'Target': target})
+        el = ET.SubElement(self.xtree.getroot(), f'{{{XMLNSName.RELATIONSHIPS.value}}}Relationship', {'Id': rid, 'Type': rtype, 'Target': target})
+        self._index(el)
         return rid
     
     def close(self):
@@ -185,17 +424,33 @@ class PartRelationshipsPart:
         if not file_handle:
             return
             
+        self._prune()
         ET.register_namespace('', XMLNSName.RELATIONSHIPS.value)
         self.xtree.write(file_handle, 'UTF-8', True)
         file_handle.close()
     
     
     def __iter__(self):
+        self._prune()
         ns = {'': XMLNSName.RELATIONSHIPS.value}
         root = self.root
         for el in self.xtree.iterfind('.//Relationship', ns):
             yield PartRelationshipsPart.resolve_rel(root, el)
     
+    def __len__(self):
+        return sum(len(els) for els in self.indexes['Id'].values())
+    
+    def _prune(self):
+        removed = self.removed
+        if removed:
+            root = self.xtree.getroot()
+            root[:] = [el for el in root if el not in removed]
+            removed.clear()
+    
+    def _index(self, el):
+        for name, index in self.indexes.items():
+            index.setdefault(el.get(name), {})[el] = None
+    
     def __enter__(self):
         return self
     
@@ -205,11 +460,170 @@ class PartRelationshipsPart:
     
     
 
+class CompressionPolicy:
+    
+    @staticmethod
+    def store():
+        return CompressionPolicy(ZIP_STORED)
+    
+    def __init__(self, compress_type=ZIP_DEFLATED, compresslevel=6, rules=None):
+        self.compress_type = compress_type
+        self.compresslevel = compresslevel
+        self.rules = {}
+        if rules:
+            for content_type, rule in rules.items():
+                self.set_rule(content_type, *rule)
+    
+    def set_rule(self, content_type, compress_type, compresslevel=None):
+        content_type = content_type.value if hasattr(content_type, 'value') else content_type
+        self.rules[content_type.casefold()] = (compress_type, compresslevel)
+    
+    def resolve(self, content_type):
+        content_type = content_type.value if hasattr(content_type, 'value') else content_type
+        if content_type:
+            rule = self.rules.get(content_type.casefold())
+            if rule:
+                return rule
+        return self.compress_type, self.compresslevel
+    
+    def zip_info(self, path, content_type, date_time=None):
+        if date_time is None:
+            date_time = datetime.now().timetuple()[:6]
+        zinfo = ZipInfo(path, date_time)
+        compress_type, compresslevel = self.resolve(content_type)
+        zinfo.compress_type = compress_type
+        setattr(zinfo, compress_level_attr, compresslevel)
+        return zinfo
+
+
+class BufferedPart(io.BytesIO):
+    def __init__(self, parts, path):
+        super().__init__()
+        self.parts = parts
+        self.path = path
+    
+    def close(self):
+        if not self.closed:
+            self.parts[self.path] = self.getvalue()
+        super().close()
+
+
+class PrefetchEntry:
+    def __init__(self, ticket, size):
+        self.ticket = ticket
+        self.size = size
+        self.claimed = False
+        self.granted = False
+        self.future = None
+
+
+class PartPrefetcher:
+    def __init__(self, fname, paths, workers=2, max_bytes=256 * 1024 * 1024):
+        self.zf = ZipFile(fname)
+        self.max_bytes = max_bytes
+        self.in_use = 0
+        self.next_ticket = 0
+        self.closed = False
+        self.cond = threading.Condition()
+        self.entries = {}
+        self.executor = ThreadPoolExecutor(workers)
+        
+        zf = self.zf
+        for path in paths:
+            path = norm_path(path, leading_slash=False)
+            if path in self.entries:
+                continue
+            try:
+                size = zf.getinfo(path).file_size
+            except KeyError:
+                continue
+            entry = self.entries[path] = PrefetchEntry(len(self.entries), size)
+            entry.future = self.executor.submit(self._load, path, entry)
+    
+    def take(self, path):
+        path = norm_path(path, leading_slash=False)
+        cond = self.cond
+        with cond:
+            entry = self.entries.pop(path, None)
+            if entry is None:
+                return None
+            # Not yet started; the caller reads it directly rather than waiting behind the budget.
+            if self.next_ticket <= entry.ticket:
+                entry.claimed = True
+                cond.notify_all()
+                return None
+        
+        try:
+            return entry.future.result()
+        finally:
+            self._release(entry)
+    
+    def cancel(self, path):
+        # Drops a part the caller will not take, so its bytes stop counting against the budget of the parts after it.
+        path = norm_path(path, leading_slash=False)
+        cond = self.cond
+        with cond:
+            entry = self.entries.pop(path, None)
+            if entry is None:
+                return
+            if self.next_ticket <= entry.ticket:
+                entry.claimed = True
+                cond.notify_all()
+                return
+        entry.future.add_done_callback(lambda future: self._release(entry))
+    
+    def close(self):
+        cond = self.cond
+        with cond:
+            self.closed = True
+            cond.notify_all()
+        self.executor.shutdown(True, cancel_futures=True)
+        for entry in self.entries.values():
+            self._release(entry)
+        self.entries.clear()
+        self.zf.close()
+    
+    def _release(self, entry):
+        with self.cond:
+            if entry.granted:
+                entry.granted = False
+                self.in_use -= entry.size
+                self.cond.notify_all()
+    
+    def _load(self, path, entry):
+        cond = self.cond
+        with cond:
+            # Budget is granted in submission order so a part the caller is waiting on is never starved by later ones.
+            while self.next_ticket != entry.ticket or not (entry.claimed or self.in_use == 0 or self.in_use + entry.size <= self.max_bytes):
+                if self.closed:
+                    return None
+                cond.wait()
+            self.next_ticket += 1
+            cond.notify_all()
+            if entry.claimed:
+                return None
+            self.in_use += entry.size
+            entry.granted = True
+        
+        return self.zf.read(path)
+
+
 class ZipOfficeOpenXMLPackage:
-    def __init__(self, fname, overwrite=False):
+    
+    default_content_types = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="xml" ContentType="application/xml"/><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/></Types>'
+    
+    def __init__(self, fname, overwrite=False, direct=False, compression=None, compress_workers=1):
         self.fname = fname
+        self.compression = compression if compression else CompressionPolicy()
+        self.compress_workers = compress_workers
         self.extract_dir = None
+        self.dirty_parts = None
+        self.direct_zip = None
+        self.buffered_parts = None
+        self.streamed_parts = None
         self.on_close_hooks = None
+        self.part_directory = None
+        self.prefetcher = None
         
         exists = True
         try:
@@ -217,19 +631,56 @@ class ZipOfficeOpenXMLPackage:
         except FileNotFoundError:
             exists = False
         
-        if not exists or overwrite:
+        if direct:
+            if exists and not overwrite:
+                raise ValueError(f'Direct write mode requires a new or overwritten package: {fname}')
+            # Parts stream straight into the archive; content types and relationships are held in memory until close.
+            self.direct_zip = ZipFile(fname, 'w', ZIP_DEFLATED, compresslevel=6)
+            self.buffered_parts = {'[Content_Types].xml': ZipOfficeOpenXMLPackage.default_content_types}
+            self.streamed_parts = set()
+        elif not exists or overwrite:
             extract_dir = self.extract_dir = TemporaryDirectory()
-            with open(os.path.join(extract_dir.name, '[Content_Types].xml'), 'w', encoding='utf-8') as f:
-                f.write('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"><Default Extension="xml" ContentType="application/xml"/><Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/></Types>')
+            with open(os.path.join(extract_dir.name, '[Content_Types].xml'), 'wb') as f:
+                f.write(ZipOfficeOpenXMLPackage.default_content_types)
 
     def register_on_close_hook(self, closeable):
         on_close_hooks = self.on_close_hooks
         if on_close_hooks is None:
             on_close_hooks = self.on_close_hooks = []
-        on_close_hooks.add(closeable)
+        on_close_hooks.append(closeable)
+    
+    def prefetch(self, paths=None, workers=2, max_bytes=256 * 1024 * 1024):
+        if self.prefetcher:
+            self.prefetcher.close()
+        
+        if paths is None:
+            paths = []
+            wb_info = self.get_part_info(self.get_part_info().get_rel('Type', RelationshipType.WORKBOOK))
+            if wb_info:
+                rels = wb_info.relationships
+                paths.extend(r for r in rels if r.rtype in (RelationshipType.SHARED_STRINGS, RelationshipType.STYLES))
+                paths.extend(r for r in rels if r.rtype == RelationshipType.WORKSHEET)
+        
+        self.prefetcher = PartPrefetcher(self.fname, paths, workers, max_bytes)
+    
+    def part_graph(self):
+        if self.part_directory is None:
+            self.part_directory = self._build_part_graph()
+        return self.part_directory
     
     def get_part_info(self, path=None):
-        path, psegs = norm_path(path, True, True)
+        name = part_name(path)
+        path = name.path
+        
+        # Keyed by PartName, so lookups match part names case-insensitively as OPC requires
+        part_directory = self.part_directory
+        if part_directory is None and not self.extract_dir and not self.direct_zip:
+            part_directory = self.part_graph()
+        if part_directory is not None and name in part_directory:
+            part_info = part_directory[name]
+            # Parts without a content type fall through so _determine_content_type raises as it always has
+            if part_info.content_type is not None or path == '/':
+                return part_info
         
         if path == '/':
             try:
@@ -253,7 +704,9 @@ class ZipOfficeOpenXMLPackage:
     def exists(self, path):
         path = norm_path(path, leading_slash=False)
         
-        if self.extract_dir:
+        if self.direct_zip:
+            return path in self.buffered_parts or path in self.streamed_parts
+        elif self.extract_dir and (self.dirty_parts is None or path in self.dirty_parts):
             try:
                 os.stat(os.path.join(self.extract_dir.name, path.replace('/', os.sep)))
             except FileNotFoundError:
@@ -265,16 +718,7 @@ class ZipOfficeOpenXMLPackage:
                 return path in f.namelist()
     
     def open_part_relationships(self, path=None, mode='r'):
-        psegs = norm_path(path, True, False)
-        
-        root = f"/{'/'.join(list(psegs)[:-1])}"
-        
-        if len(psegs):
-            psegs.insert(-1, '_rels')
-            psegs[-1] = f'{psegs[-1]}.rels'
-            rel_path = '/'.join(psegs)
-        else:
-            rel_path = '_rels/.rels'
+        root, rel_path = rels_path(path)
         
         if not self.exists(rel_path) and mode == 'w':
             with self.open_part(rel_path, 'w') as f:
@@ -285,7 +729,13 @@ class ZipOfficeOpenXMLPackage:
         
         return PartRelationshipsPart(root, xtree, self.open_part(rel_path, 'w') if mode == 'w' else None)
     
-    def open_part(self, path, mode='r', content_type=None, update_content_type=False):
+    def open_part(self, path, mode='r', content_type=None, update_content_type=False, size_hint=None):
+        part_directory = self.part_directory
+        if mode == 'r' and part_directory is not None:
+            # The directory knows the stored spelling of a part name that differs only in case
+            part_info = part_directory.get(part_name(path))
+            if part_info is not None:
+                path = part_info.path
         path = norm_path(path, leading_slash=False)
         if content_type and hasattr(content_type, 'value'):
             content_type = content_type.value
@@ -306,10 +756,41 @@ class ZipOfficeOpenXMLPackage:
             if path != '[Content_Types].xml' and not path.endswith('.rels'):
                 self._add_content_type(path, content_type, update_content_type)
         
-        if mode == 'w' and not self.extract_dir:
-            self._extract_temp()
+        if mode == 'w':
+            self.part_directory = None
+            if self.prefetcher:
+                self.prefetcher.close()
+                self.prefetcher = None
+            if not self.extract_dir and not self.direct_zip:
+                self._extract_temp()
         
-        if self.extract_dir:
+        prefetcher = self.prefetcher
+        if prefetcher:
+            data = prefetcher.take(path)
+            if data is not None:
+                return io.BytesIO(data)
+        
+        direct_zip = self.direct_zip
+        if direct_zip:
+            buffered_parts = self.buffered_parts
+            if path in buffered_parts or path.endswith('.rels'):
+                return io.BytesIO(buffered_parts[path]) if mode == 'r' else BufferedPart(buffered_parts, path)
+            
+            if mode == 'r':
+                raise ValueError(f'Parts streamed into a direct write package cannot be read back: {path}')
+            if path in self.streamed_parts:
+                raise ValueError(f'Part has already been written to the package: {path}')
+            self.streamed_parts.add(path)
+            
+            # ZipFile reserves ZIP64 fields from file_size, so a hint decides it. Without one, only binary parts are assumed
+            # able to pass 2 GiB; a streamed part that outgrows a header without ZIP64 fields fails on close.
+            zinfo = self.compression.zip_info(path, content_type)
+            if size_hint is not None:
+                zinfo.file_size = size_hint
+            return direct_zip.open(zinfo, 'w', force_zip64=size_hint is None and path.endswith('.bin'))
+        elif self.extract_dir and (self.dirty_parts is None or mode == 'w' or path in self.dirty_parts):
+            if mode == 'w' and self.dirty_parts is not None:
+                self.dirty_parts.add(path)
             target = os.path.join(self.extract_dir.name, path.replace('/', os.sep))
             target_dir = os.path.split(target)[0]
             if target_dir:
@@ -326,14 +807,54 @@ class ZipOfficeOpenXMLPackage:
             for closeable in on_close_hooks:
                 closeable.close()
         
+        if self.prefetcher:
+            self.prefetcher.close()
+            self.prefetcher = None
+        
+        direct_zip = self.direct_zip
+        if direct_zip:
+            compression = self.compression
+            content_type_of = self._content_type_resolver()
+            for path, data in self.buffered_parts.items():
+                direct_zip.writestr(compression.zip_info(path, content_type_of(path)), data)
+            direct_zip.close()
+            self.direct_zip = None
+        
         extract_dir = self.extract_dir
         if extract_dir:
-            rec_zip(self.fname, extract_dir.name)
+            if self.dirty_parts is None:
+                rec_zip(self.fname, extract_dir.name, self.compression, self._content_type_resolver(), self.compress_workers)
+            elif self.dirty_parts:
+                self._write_update()
             extract_dir.cleanup()
+            self.extract_dir = None
+    
+    @staticmethod
+    def read_content_types(stream):
+        ns = {'': XMLNSName.CONTENT_TYPES.value}
+        xtree = ET.parse(stream)
+        
+        # First entry wins, as in _determine_content_type
+        defaults = {}
+        overrides = {}
+        for default in xtree.iterfind('.//Default', ns):
+            defaults.setdefault(default.get('Extension').casefold(), default.get('ContentType'))
+        for override in xtree.iterfind('.//Override', ns):
+            overrides.setdefault(override.get('PartName').casefold(), override.get('ContentType'))
+        return defaults, overrides
+    
+    @staticmethod
+    def lookup_content_type(defaults, overrides, folded_path):
+        content_type = overrides.get(folded_path)
+        if content_type is None:
+            ext_i = folded_path.rfind('.')
+            if ext_i != -1:
+                content_type = defaults.get(folded_path[ext_i + 1:])
+        return content_type
     
     def _determine_content_type(self, path, err_if_none=True):
         ns = {'': XMLNSName.CONTENT_TYPES.value}
-        path = path.casefold()
+        path = part_name(path).folded
         
         # Open Media Stream
         try:
@@ -361,10 +882,69 @@ class ZipOfficeOpenXMLPackage:
         else:
             return None
     
+    def _build_part_graph(self):
+        rels_ns = {'': XMLNSName.RELATIONSHIPS.value}
+        
+        with ZipFile(self.fname) as zf:
+            names = [name for name in zf.namelist() if not name.endswith('/')]
+            
+            # Content Types
+            defaults = {}
+            overrides = {}
+            if '[Content_Types].xml' in names:
+                with zf.open('[Content_Types].xml') as f:
+                    defaults, overrides = ZipOfficeOpenXMLPackage.read_content_types(f)
+            
+            # Relationships
+            relationships = {}
+            for name in names:
+                psegs = name.split('/')
+                if len(psegs) < 2 or psegs[-2] != '_rels' or not psegs[-1].endswith('.rels'):
+                    continue
+                
+                root = f"/{'/'.join(psegs[:-2])}"
+                source = part_name('/'.join(psegs[:-2] + [psegs[-1][:-5]]))
+                with zf.open(name) as f:
+                    xtree = ET.parse(f)
+                
+                rels = relationships[source] = []
+                for el in xtree.iterfind('.//Relationship', rels_ns):
+                    rel = PartRelationshipsPart.resolve_rel(root, el)
+                    if el.get('TargetMode') != 'External':
+                        rel.target = norm_path(rel.target)
+                    rels.append(rel)
+        
+        root_name = part_name('/')
+        result = {root_name: PartInfo('/', None, relationships.get(root_name, []))}
+        for name in names:
+            name = part_name(name)
+            path = name.path
+            if path == '/[Content_Types].xml':
+                continue
+            
+            content_type = ZipOfficeOpenXMLPackage.lookup_content_type(defaults, overrides, name.folded)
+            
+            result[name] = PartInfo(path, ContentType.resolve(content_type) if content_type else None, relationships.get(name, []))
+        
+        return result
+    
+    def _content_type_resolver(self):
+        # Parsed once per write rather than once per member through _determine_content_type.
+        try:
+            with self.open_part('[Content_Types].xml') as f:
+                defaults, overrides = ZipOfficeOpenXMLPackage.read_content_types(f)
+        except FileNotFoundError:
+            defaults = overrides = {}
+        
+        def content_type_of(path):
+            content_type = ZipOfficeOpenXMLPackage.lookup_content_type(defaults, overrides, part_name(path).folded)
+            return ContentType.resolve(content_type) if content_type else None
+        return content_type_of
+    
     def _add_content_type(self, path, content_type, update_override=False):
         ns = {'': XMLNSName.CONTENT_TYPES.value}
         ET.register_namespace('', XMLNSName.CONTENT_TYPES.value)
-        path = f'/{path.casefold()}'
+        path = part_name(path).folded
         content_type = (content_type.value if hasattr(content_type, 'value') else content_type)
         if content_type:
             content_type = content_type.casefold()
@@ -420,9 +1000,49 @@ class ZipOfficeOpenXMLPackage:
         if self.extract_dir:
             return
         
-        extract_dir = self.extract_dir = TemporaryDirectory()
-        with ZipFile(self.fname, 'r') as f:
-            f.extractall(extract_dir.name)
+        # Only parts written in this session land here; the rest are copied from the source archive on close.
+        self.extract_dir = TemporaryDirectory()
+        self.dirty_parts = set()
+    
+    def _write_update(self):
+        fname = self.fname
+        extract_dir = self.extract_dir.name
+        dirty_parts = self.dirty_parts
+        compression = self.compression
+        content_type_of = self._content_type_resolver()
+        
+        def dirty_member(path):
+            return compression.zip_info(path, content_type_of(path)), os.path.join(extract_dir, path.replace('/', os.sep))
+        
+        fd, tmp_name = mkstemp(prefix=f'{os.path.basename(fname)}.', dir=os.path.dirname(os.path.abspath(fname)))
+        try:
+            with os.fdopen(fd, 'w+b') as f:
+                with ZipFile(fname) as src, ZipFile(f, 'w', ZIP_DEFLATED, compresslevel=6) as dest:
+                    members = []
+                    pending = set(dirty_parts)
+                    for info in src.infolist():
+                        path = info.filename
+                        if path in pending:
+                            members.append(dirty_member(path))
+                            pending.remove(path)
+                        else:
+                            members.append((info, src))
+                    members.extend(dirty_member(path) for path in sorted(pending))
+                    
+                    zip_members(dest, members, self.compress_workers)
+            
+            # mkstemp creates the file 0600; keep the original's permissions and, where allowed, its owner.
+            shutil.copymode(fname, tmp_name)
+            if hasattr(os, 'chown'):
+                st = os.stat(fname)
+                try:
+                    os.chown(tmp_name, st.st_uid, st.st_gid)
+                except OSError:
+                    pass
+            os.replace(tmp_name, fname)
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
     
     def __enter__(self):
         return self
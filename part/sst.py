@@ -1,12 +1,35 @@
 
+import io
+import sys
 import struct
+import threading
+from array import array
 from enum import Enum
+from functools import lru_cache
+from multiprocessing import shared_memory, resource_tracker
 
 import btypes
 from btypes import BinaryRecordType
 from bprocessor import UnexpectedRecordException, RecordProcessor, RecordRepository, RecordDescriptor
 
 
+attach_lock = threading.Lock()
+
+def attach_shared_memory(name):
+    # Only the creating process tracks the segment. Before 3.13 attaching registers it with the resource tracker as if
+    # this process owned it too, so a tracker not shared with the owner warns about a leak and unlinks it at exit.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name, track=False)
+    
+    with attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
+
+
 class SharedStringsPart:
     @staticmethod
     def validate_str_count(value):
@@ -37,6 +60,26 @@ class SharedStringsPart:
         
         return SharedStringsPart(cst_total, items, repository=repository)
     
+    @staticmethod
+    def scan_items(stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        
+        offsets = array('Q')
+        for offset, r in rprocessor.scan(BinaryRecordType.BrtSSTItem):
+            offsets.append(offset)
+        
+        return offsets
+    
+    @staticmethod
+    def read_item(stream, offset):
+        rprocessor = RecordProcessor.resolve(stream)
+        rprocessor.seek(offset)
+        
+        r = rprocessor.read_descriptor()
+        if r.rtype != BinaryRecordType.BrtSSTItem:
+            raise UnexpectedRecordException(r, BinaryRecordType.BrtSSTItem)
+        return RichStr.read(rprocessor)
+    
     
     def __init__(self, reference_count, items, *, repository):
         SharedStringsPart.validate_str_count(reference_count)
@@ -67,6 +110,83 @@ class SharedStringsPart:
         return self.items[i]
     
 
+
+class SharedStringTable:
+    @staticmethod
+    def read(stream, cache_size=4096):
+        data = stream.read()
+        offsets = SharedStringsPart.scan_items(io.BytesIO(data))
+        return SharedStringTable(data, offsets, cache_size=cache_size)
+    
+    @staticmethod
+    def attach(handle, cache_size=4096):
+        name, count, data_size = handle
+        shm = attach_shared_memory(name)
+        
+        offsets_size = count * 8
+        buf = shm.buf
+        offsets = buf[:offsets_size].cast('Q')
+        data = buf[offsets_size:offsets_size + data_size]
+        return SharedStringTable(data, offsets, cache_size=cache_size, shm=shm)
+    
+    def __init__(self, data, offsets, *, cache_size=4096, shm=None):
+        self.data = data
+        self.offsets = offsets
+        self.shm = shm
+        self.owner = False
+        self._get = lru_cache(maxsize=cache_size)(self._read_item)
+    
+    @property
+    def handle(self):
+        shm = self.shm
+        return (shm.name, len(self.offsets), len(self.data)) if shm else None
+    
+    def share(self):
+        offsets = self.offsets
+        data = self.data
+        offsets_size = len(offsets) * 8
+        
+        shm = shared_memory.SharedMemory(create=True, size=max(1, offsets_size + len(data)))
+        buf = shm.buf
+        buf[:offsets_size] = memoryview(offsets).cast('B')
+        buf[offsets_size:offsets_size + len(data)] = data
+        
+        result = SharedStringTable(buf[offsets_size:offsets_size + len(data)], buf[:offsets_size].cast('Q'), cache_size=self._get.cache_info().maxsize, shm=shm)
+        result.owner = True
+        return result
+    
+    def close(self):
+        shm = self.shm
+        if not shm:
+            return
+        
+        self._get.cache_clear()
+        self.offsets.release()
+        self.data.release()
+        shm.close()
+        if self.owner:
+            shm.unlink()
+        self.shm = None
+    
+    def _read_item(self, i):
+        offsets = self.offsets
+        start = offsets[i]
+        end = offsets[i + 1] if i + 1 < len(offsets) else len(self.data)
+        return SharedStringsPart.read_item(io.BytesIO(self.data[start:end]), 0)
+    
+    def __getitem__(self, i):
+        return self._get(i)
+    
+    def __len__(self):
+        return len(self.offsets)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 class RichStr:
     @staticmethod
     def validate_str_run_count(value):
@@ -1,12 +1,18 @@
 
 
+import copy
+import colorsys
 import struct
+from collections import namedtuple
+from functools import lru_cache
+from operator import attrgetter
 
 from btypes import BinaryRecordType, HorizontalAlignmentType, VerticalAlignmentType, ReadingOrderType, XFProperty, ColorType, \
         PaletteColor, ThemeColor, SubscriptType, UnderlineType, FontFamilyType, CharacterSetType, FontSchemeType, FillType, GradientType, \
-        BorderType
+        BorderType, palette_rgba
 from bprocessor import UnexpectedRecordException, RecordProcessor, RecordRepository, RecordDescriptor
 from part import ACUid
+from numfmt import parse_format, implied_formats
 
 
 
@@ -41,6 +47,25 @@ num_format_lu_all_langs = {
     , 49: '@'
 }
 
+def code_of(value):
+    return value if type(value) is int else value.value
+
+def coded(name, enum_type):
+    # Keeps the raw integer code; the enum member is only looked up when the attribute is read.
+    private = f'_{name}'
+    members = dict((member.value, member) for member in enum_type)
+    get_code = attrgetter(private)
+    def fget(self):
+        code = get_code(self)
+        try:
+            return members[code]
+        except KeyError:
+            return enum_type(code)
+    def fset(self, value):
+        setattr(self, private, code_of(value))
+    return property(fget, fset)
+
+
 class StylesheetPart:
     @staticmethod
     def create_default():
@@ -53,8 +78,28 @@ class StylesheetPart:
         styles = [StyleInfo.create_default()]
         return StylesheetPart(formats, fonts, fills, borders, style_xfs, cell_xfs, styles)
 
+    sections = ('formats', 'fonts', 'fills', 'borders', 'style_xfs', 'cell_xfs', 'styles')
+    
+    @staticmethod
+    def read_formats(stream):
+        return StylesheetPart.read(stream, sections=('formats', 'cell_xfs'))
+    
+    @staticmethod
+    def skip_block(rprocessor, r, end_rtype):
+        r.skip(rprocessor)
+        rprocessor.skip_until(end_rtype)
+        return rprocessor.read_descriptor()
+    
     @staticmethod
-    def read(stream, for_update=False):
+    def read(stream, for_update=False, sections=None):
+        if sections is not None:
+            if for_update:
+                raise ValueError('A stylesheet read for update must be read in full.')
+            unknown = set(sections).difference(StylesheetPart.sections)
+            if unknown:
+                raise ValueError(f'Unknown stylesheet sections: {", ".join(sorted(unknown))}')
+        skipped = frozenset(StylesheetPart.sections).difference(sections) if sections is not None else frozenset()
+        
         rprocessor = RecordProcessor.resolve(stream)
         repository = RecordRepository(for_update)
         
@@ -67,10 +112,13 @@ class StylesheetPart:
         
         # Formats
         formats = []
-        if r.rtype == BinaryRecordType.BrtBeginFmts:
+        if r.rtype == BinaryRecordType.BrtBeginFmts and 'formats' in skipped:
+            formats = None
+            r = StylesheetPart.skip_block(rprocessor, r, BinaryRecordType.BrtEndFmts)
+        elif r.rtype == BinaryRecordType.BrtBeginFmts:
             cfmts = struct.unpack('<I', rprocessor.read(4))[0]
+            r = rprocessor.read_descriptor()
             for i in range(cfmts):
-                r = rprocessor.read_descriptor()
                 # AC 2016 Formatting (Cheating by skipping w/repository)
                 # Skip1
                 if r.rtype == BinaryRecordType.BrtACBegin:
@@ -94,7 +142,10 @@ class StylesheetPart:
             r = rprocessor.read_descriptor()
         
         # Fonts
-        if r.rtype == BinaryRecordType.BrtBeginFonts:
+        if r.rtype == BinaryRecordType.BrtBeginFonts and 'fonts' in skipped:
+            fonts = None
+            r = StylesheetPart.skip_block(rprocessor, r, BinaryRecordType.BrtEndFonts)
+        elif r.rtype == BinaryRecordType.BrtBeginFonts:
             fonts = FontList(repository=repository)
             cfonts = struct.unpack('<I', rprocessor.read(4))[0]
             for i in range(cfonts):
@@ -119,7 +170,10 @@ class StylesheetPart:
         
         # Fills
         fills = []
-        if r.rtype == BinaryRecordType.BrtBeginFills:
+        if r.rtype == BinaryRecordType.BrtBeginFills and 'fills' in skipped:
+            fills = None
+            r = StylesheetPart.skip_block(rprocessor, r, BinaryRecordType.BrtEndFills)
+        elif r.rtype == BinaryRecordType.BrtBeginFills:
             cfills = struct.unpack('<I', rprocessor.read(4))[0]
             for i in range(cfills):
                 r = rprocessor.read_descriptor()
@@ -135,7 +189,10 @@ class StylesheetPart:
         
         # Borders
         borders = []
-        if r.rtype == BinaryRecordType.BrtBeginBorders:
+        if r.rtype == BinaryRecordType.BrtBeginBorders and 'borders' in skipped:
+            borders = None
+            r = StylesheetPart.skip_block(rprocessor, r, BinaryRecordType.BrtEndBorders)
+        elif r.rtype == BinaryRecordType.BrtBeginBorders:
             cborders = struct.unpack('<I', rprocessor.read(4))[0]
             for i in range(cborders):
                 r = rprocessor.read_descriptor()
@@ -153,47 +210,59 @@ class StylesheetPart:
         if r.rtype != BinaryRecordType.BrtBeginCellStyleXFs:
             raise UnexpectedRecordException(r, BinaryRecordType.BrtBeginCellStyleXFs)
             
-        cxfs = struct.unpack('<I', rprocessor.read(4))[0]
-        style_xfs = []
-        r = rprocessor.read_descriptor()
-        for i in range(cxfs):
-            if r.rtype == BinaryRecordType.BrtEndCellStyleXFs:
-                break
-            if r.rtype != BinaryRecordType.BrtXF:
-                raise UnexpectedRecordException(r, BinaryRecordType.BrtXF)
+        if 'style_xfs' in skipped:
+            style_xfs = None
+            r = StylesheetPart.skip_block(rprocessor, r, BinaryRecordType.BrtEndCellStyleXFs)
+        else:
+            cxfs = struct.unpack('<I', rprocessor.read(4))[0]
+            style_xfs = []
+            r = rprocessor.read_descriptor()
+            for i in range(cxfs):
+                if r.rtype == BinaryRecordType.BrtEndCellStyleXFs:
+                    break
+                if r.rtype != BinaryRecordType.BrtXF:
+                    raise UnexpectedRecordException(r, BinaryRecordType.BrtXF)
+                
+                style_xfs.append(CellXF.read(rprocessor, repository=repository))
+                # Skip5
+                r = rprocessor.skip_until(BinaryRecordType.BrtXF, BinaryRecordType.BrtEndCellStyleXFs, repository=repository)
+                repository.push_current()
             
-            style_xfs.append(CellXF.read(rprocessor, repository=repository))
-            # Skip5
-            r = rprocessor.skip_until(BinaryRecordType.BrtXF, BinaryRecordType.BrtEndCellStyleXFs, repository=repository)
-            repository.push_current()
-        
-        if r.rtype != BinaryRecordType.BrtEndCellStyleXFs:
-            raise UnexpectedRecordException(r, BinaryRecordType.BrtEndCellStyleXFs)
-        r = rprocessor.read_descriptor()
+            if r.rtype != BinaryRecordType.BrtEndCellStyleXFs:
+                raise UnexpectedRecordException(r, BinaryRecordType.BrtEndCellStyleXFs)
+            r = rprocessor.read_descriptor()
         
         
         # Cell XFs
         if r.rtype != BinaryRecordType.BrtBeginCellXFs:
             raise UnexpectedRecordException(r, BinaryRecordType.BrtBeginCellXFs)
             
-        cxfs = struct.unpack('<I', rprocessor.read(4))[0]
-        cell_xfs = []
-        r = rprocessor.read_descriptor()
-        for i in range(cxfs):
-            if r.rtype == BinaryRecordType.BrtEndCellXFs:
-                break
-            if r.rtype != BinaryRecordType.BrtXF:
-                raise UnexpectedRecordException(r, BinaryRecordType.BrtXF)
+        if 'cell_xfs' in skipped:
+            cell_xfs = None
+            r = StylesheetPart.skip_block(rprocessor, r, BinaryRecordType.BrtEndCellXFs)
+        else:
+            cxfs = struct.unpack('<I', rprocessor.read(4))[0]
+            cell_xfs = []
+            r = rprocessor.read_descriptor()
+            for i in range(cxfs):
+                if r.rtype == BinaryRecordType.BrtEndCellXFs:
+                    break
+                if r.rtype != BinaryRecordType.BrtXF:
+                    raise UnexpectedRecordException(r, BinaryRecordType.BrtXF)
+                
+                cell_xfs.append(CellXF.read(rprocessor, repository=repository))
+                # Skip5
+                r = rprocessor.skip_until(BinaryRecordType.BrtXF, BinaryRecordType.BrtEndCellXFs, repository=repository)
+                repository.push_current()
             
-            cell_xfs.append(CellXF.read(rprocessor, repository=repository))
-            # Skip5
-            r = rprocessor.skip_until(BinaryRecordType.BrtXF, BinaryRecordType.BrtEndCellXFs, repository=repository)
-            repository.push_current()
+            if r.rtype != BinaryRecordType.BrtEndCellXFs:
+                raise UnexpectedRecordException(r, BinaryRecordType.BrtEndCellXFs)
+            r = rprocessor.read_descriptor()
         
-        if r.rtype != BinaryRecordType.BrtEndCellXFs:
-            raise UnexpectedRecordException(r, BinaryRecordType.BrtEndCellXFs)
-        r = rprocessor.read_descriptor()
         
+        # Nothing after the cell XFs was requested; leave the rest of the part unread
+        if 'styles' in skipped:
+            return StylesheetPart(formats, fonts, fills, borders, style_xfs, cell_xfs, None)
         
         # Styles
         if r.rtype != BinaryRecordType.BrtBeginStyles:
@@ -236,8 +305,76 @@ class StylesheetPart:
         self.cell_xfs = cell_xfs
         self.styles = styles
         self.repository = repository
+        self.resolved_styles = None
+        self.format_strs = None
+        self.format_infos = None
+        self.cell_format_infos = None
+        self._theme = None
+    
+    @property
+    def theme(self):
+        return self._theme
+    
+    @theme.setter
+    def theme(self, value):
+        # Resolved styles hold theme colours already looked up
+        self._theme = value
+        self.resolved_styles = None
+    
+    def check_sections(self, names, purpose):
+        missing = [name for name in names if getattr(self, name) is None]
+        if missing:
+            raise ValueError(f'Stylesheet was read without the following sections and cannot be {purpose}: {", ".join(missing)}')
+    
+    def cell_style(self, style_index):
+        resolved_styles = self.resolved_styles
+        if resolved_styles is None:
+            self.check_sections(('formats', 'fonts', 'fills', 'borders', 'cell_xfs'), 'used to resolve cell styles')
+            resolved_styles = self.resolved_styles = [None] * len(self.cell_xfs)
+        
+        style = resolved_styles[style_index]
+        if style is None:
+            style = resolved_styles[style_index] = CellStyle.resolve(self, self.cell_xfs[style_index], style_index)
+        return style
+    
+    def format_str(self, format_id):
+        format_strs = self.format_strs
+        if format_strs is None:
+            self.check_sections(('formats',), 'used to look up number formats')
+            format_strs = self.format_strs = dict((fmt.format_id, fmt.format_str) for fmt in self.formats)
+        
+        format_str = format_strs.get(format_id)
+        return format_str if format_str is not None else num_format_lu_all_langs.get(format_id, '')
+    
+    def format_info(self, format_id):
+        format_infos = self.format_infos
+        if format_infos is None:
+            format_infos = self.format_infos = {}
+        
+        info = format_infos.get(format_id)
+        if info is None:
+            format_str = self.format_str(format_id)
+            if not format_str:
+                format_str = implied_formats.get(format_id, format_str)
+            info = format_infos[format_id] = parse_format(format_str)
+        return info
+    
+    def cell_format_info(self, style_index):
+        cell_format_infos = self.cell_format_infos
+        if cell_format_infos is None:
+            self.check_sections(('formats', 'cell_xfs'), 'used to look up number formats')
+            cell_format_infos = self.cell_format_infos = [self.format_info(xf.format_id) for xf in self.cell_xfs]
+        return cell_format_infos[style_index]
+    
+    def clear_style_cache(self):
+        self.resolved_styles = None
+        self.format_strs = None
+        self.format_infos = None
+        self.cell_format_infos = None
     
     def write(self, stream):
+        self.check_sections(StylesheetPart.sections, 'written')
+        
         rprocessor = RecordProcessor.resolve(stream)
         repository = self.repository
         if repository:
@@ -301,7 +438,190 @@ class StylesheetPart:
         RecordDescriptor(BinaryRecordType.BrtEndStyleSheet).write(rprocessor)
 
 
+class StyleRegistry:
+    first_custom_format_id = 164
+    max_custom_format_id = 382
+    
+    def __init__(self, stylesheet=None):
+        if stylesheet is None:
+            stylesheet = StylesheetPart.create_default()
+        stylesheet.check_sections(StylesheetPart.sections, 'extended')
+        self.stylesheet = stylesheet
+        
+        self.format_ids = dict((format_str, format_id) for format_id, format_str in reversed(num_format_lu_all_langs.items()))
+        self.format_ids.update((fmt.format_str, fmt.format_id) for fmt in stylesheet.formats)
+        self.next_format_id = max((fmt.format_id + 1 for fmt in stylesheet.formats), default=self.first_custom_format_id)
+        self.next_format_id = max(self.next_format_id, self.first_custom_format_id)
+        
+        self.font_indexes = StyleRegistry.index(stylesheet.fonts)
+        self.fill_indexes = StyleRegistry.index(stylesheet.fills)
+        self.border_indexes = StyleRegistry.index(stylesheet.borders)
+        self.xf_indexes = StyleRegistry.index(stylesheet.cell_xfs)
+    
+    @staticmethod
+    def index(items):
+        indexes = {}
+        for i, item in enumerate(items):
+            indexes.setdefault(item.key(), i)
+        return indexes
+    
+    @staticmethod
+    def intern(indexes, items, item):
+        key = item.key()
+        index = indexes.get(key)
+        if index is None:
+            index = indexes[key] = len(items)
+            items.append(item)
+        return index
+    
+    def add_format(self, format_str):
+        format_id = self.format_ids.get(format_str)
+        if format_id is None:
+            format_id = self.next_format_id
+            if format_id > self.max_custom_format_id:
+                raise ValueError(f'No custom number format IDs left for format string: {format_str}')
+            
+            self.stylesheet.formats.append(NumberFormat(format_id, format_str))
+            self.format_ids[format_str] = format_id
+            self.next_format_id = format_id + 1
+            self.stylesheet.format_strs = None
+            self.stylesheet.format_infos = None
+        return format_id
+    
+    def add_font(self, font):
+        return StyleRegistry.intern(self.font_indexes, self.stylesheet.fonts, font)
+    
+    def add_fill(self, fill):
+        return StyleRegistry.intern(self.fill_indexes, self.stylesheet.fills, fill)
+    
+    def add_border(self, border):
+        return StyleRegistry.intern(self.border_indexes, self.stylesheet.borders, border)
+    
+    def add_xf(self, xf):
+        cell_xfs = self.stylesheet.cell_xfs
+        count = len(cell_xfs)
+        index = StyleRegistry.intern(self.xf_indexes, cell_xfs, xf)
+        
+        if len(cell_xfs) > count:
+            stylesheet = self.stylesheet
+            if stylesheet.resolved_styles is not None:
+                stylesheet.resolved_styles.append(None)
+            if stylesheet.cell_format_infos is not None:
+                stylesheet.cell_format_infos.append(stylesheet.format_info(xf.format_id))
+        return index
+    
+    def add_style(self, number_format=None, font=None, fill=None, border=None, xf=None):
+        xf = copy.copy(xf if xf is not None else self.stylesheet.cell_xfs[0])
+        xf.repository = None
+        
+        if number_format is not None:
+            xf.format_id = self.add_format(number_format)
+            xf.set_gr_bit_val(XFProperty.FMT, True)
+        if font is not None:
+            xf.font_index = self.add_font(font)
+            xf.set_gr_bit_val(XFProperty.FONT, True)
+        if fill is not None:
+            xf.fill_index = self.add_fill(fill)
+            xf.set_gr_bit_val(XFProperty.FILL, True)
+        if border is not None:
+            xf.border_index = self.add_border(border)
+            xf.set_gr_bit_val(XFProperty.BORDER, True)
+        return self.add_xf(xf)
+
+
+class CellStyle(namedtuple('CellStyle', ('style_index', 'number_format', 'font_height', 'italic', 'strikeout', 'font_weight', 'subscript_type',
+        'underline_type', 'font_family', 'charset', 'text_color', 'font_scheme', 'font_name', 'fill_type', 'fill_fg_color', 'fill_bg_color',
+        'fill_grad_type', 'fill_grad_angle', 'fill_grad_left', 'fill_grad_right', 'fill_grad_top', 'fill_grad_bottom', 'fill_grad_stops',
+        'border_top_type', 'border_top_color', 'border_bottom_type', 'border_bottom_color', 'border_left_type', 'border_left_color',
+        'border_right_type', 'border_right_color', 'border_diag_type', 'border_diag_color', 'has_diag_down_border', 'has_diag_up_border',
+        'text_trot', 'indent', 'horizontal_alignment', 'vertical_alignment', 'wrap_text', 'shrink_to_fit', 'reading_order_type', 'locked', 'hidden'))):
+    __slots__ = ()
+    
+    @staticmethod
+    def resolve(stylesheet, xf, style_index=None):
+        fonts = stylesheet.fonts
+        fills = stylesheet.fills
+        borders = stylesheet.borders
+        
+        font = fonts[xf.font_index] if xf.font_index < len(fonts) else Font.create_default()
+        fill = fills[xf.fill_index] if xf.fill_index < len(fills) else Fill.create_default()
+        border = borders[xf.border_index] if xf.border_index < len(borders) else Border.create_default()
+        
+        # Colours are resolved to PackedColor values, so a cached style shares nothing mutable with the parts it came from
+        theme = stylesheet.theme
+        gradient_stops = tuple((stop.color.packed(theme), stop.position) for stop in fill.gradient_stops)
+        
+        return CellStyle(style_index, stylesheet.format_str(xf.format_id), font.height, font.italic, font.strikeout, font.weight, font.subscript_type,
+                font.underline_type, font.family, font.char_set_type, font.color.packed(theme), font.font_scheme, font.name, fill.fill_type,
+                fill.foreground_color.packed(theme), fill.background_color.packed(theme), fill.gradient_type, fill.gradient_angle, fill.gradient_fill_left,
+                fill.gradient_fill_right, fill.gradient_fill_top, fill.gradient_fill_bottom, gradient_stops, border.top.border_type,
+                border.top.color.packed(theme), border.bottom.border_type, border.bottom.color.packed(theme), border.left.border_type,
+                border.left.color.packed(theme), border.right.border_type, border.right.color.packed(theme), border.diagonal.border_type,
+                border.diagonal.color.packed(theme), border.has_diagonal_down, border.has_diagonal_up, xf.text_trot, xf.indent, xf.horizontal_align_type, xf.vertical_align_type, xf.wrap_text,
+                xf.shrink_to_fit, xf.reading_order_type, xf.locked, xf.hidden)
+
+
+class PackedColor(int):
+    __slots__ = ()
+    
+    @staticmethod
+    def from_rgba(red, green, blue, alpha=0xff):
+        return PackedColor((red << 24) | (green << 16) | (blue << 8) | alpha)
+    
+    @property
+    def red(self):
+        return self >> 24
+    
+    @property
+    def green(self):
+        return (self >> 16) & 0xff
+    
+    @property
+    def blue(self):
+        return (self >> 8) & 0xff
+    
+    @property
+    def alpha(self):
+        return self & 0xff
+    
+    def with_tint(self, tint):
+        hue, lum, sat = colorsys.rgb_to_hls(self.red / 255, self.green / 255, self.blue / 255)
+        lum = lum * (1 + tint) if tint < 0 else lum * (1 - tint) + tint
+        red, green, blue = colorsys.hls_to_rgb(hue, lum, sat)
+        return PackedColor.from_rgba(round(red * 255), round(green * 255), round(blue * 255), self.alpha)
+    
+    def __repr__(self):
+        return f'PackedColor(0x{self:08X})'
+
+@lru_cache(maxsize=4096)
+def resolve_color(key, theme_colors=None):
+    color_type, shade_amount, color_index, valid_rgba, red, green, blue, alpha = key
+    
+    rgba = None
+    if color_type == ColorType.RGBA.value:
+        rgba = (red << 24) | (green << 16) | (blue << 8) | alpha
+    elif color_type == ColorType.PALETTE.value:
+        rgba = palette_rgba[color_index] if color_index < len(palette_rgba) else None
+    elif color_type == ColorType.THEME.value and theme_colors is not None:
+        rgba = theme_colors[color_index] if color_index < len(theme_colors) else None
+    
+    # Automatic, system and unresolved theme colors fall back to the last RGB value Excel stored, if any
+    if rgba is None:
+        if not valid_rgba:
+            return None
+        rgba = (red << 24) | (green << 16) | (blue << 8) | alpha
+    
+    color = PackedColor(rgba)
+    return color.with_tint(shade_amount / 32767) if shade_amount else color
+
+
 class Color:
+    __slots__ = ('_color_type', 'shade_amount', '_color_index', 'valid_rgba', '_red', '_green', '_blue', '_alpha')
+    
+    record = struct.Struct('<BBhBBBB')
+    palette_colors = dict((member.value, member) for member in PaletteColor)
+    theme_colors = dict((member.value, member) for member in ThemeColor)
+    
     @staticmethod
     def from_rgba(red, green, blue, alpha):
         return Color(ColorType.RGBA, 0, 0, True, red, green, blue, alpha)
@@ -311,33 +631,45 @@ class Color:
         red, green, blue, alpha = struct.pack('>I', rgba_int32)
         return Color.from_rgba(red, green, blue, alpha)
     
+    @staticmethod
+    def from_packed(packed):
+        return Color.from_rgba(packed >> 24, (packed >> 16) & 0xff, (packed >> 8) & 0xff, packed & 0xff)
+    
     @staticmethod
     def read(stream):
-        flags, index = stream.read(2)
-        f_valid_rgb = flags & 0x01
-        x_color_type = (flags & 0xfe) >> 1
-        
-        n_tint_and_shade = struct.unpack('<h', stream.read(2))[0]
-        b_red, b_green, b_blue, b_alpha = stream.read(4)
-        
-        color_type = ColorType(x_color_type)
-        if color_type == ColorType.INDEX:
-            index = PaletteColor(index)
-        elif color_type == ColorType.THEME:
-            index = ThemeColor(index)
-        
-        return Color(color_type, n_tint_and_shade, index, bool(f_valid_rgb), b_red, b_green, b_blue, b_alpha)
+        return Color.decode(stream.read(8))
+    
+    @staticmethod
+    def decode(data, offset=0):
+        flags, index, n_tint_and_shade, b_red, b_green, b_blue, b_alpha = Color.record.unpack_from(data, offset)
+        return Color(flags >> 1, n_tint_and_shade, index, bool(flags & 0x01), b_red, b_green, b_blue, b_alpha)
         
     def __init__(self, color_type, shade_amount, color_index, valid_rgba, red, green, blue, alpha):
-        self.color_type = color_type
+        self._color_type = code_of(color_type)
         self.shade_amount = shade_amount
-        self.color_index = color_index
+        self._color_index = code_of(color_index)
         self.valid_rgba = valid_rgba
         self._red = red
         self._green = green
         self._blue = blue
         self._alpha = alpha
     
+    color_type = coded('color_type', ColorType)
+    
+    @property
+    def color_index(self):
+        index = self._color_index
+        color_type = self._color_type
+        if color_type == 0x01:
+            return Color.palette_colors.get(index, index)
+        elif color_type == 0x03:
+            return Color.theme_colors.get(index, index)
+        return index
+    
+    @color_index.setter
+    def color_index(self, value):
+        self._color_index = code_of(value)
+    
     
     @property
     def red(self):
@@ -418,17 +750,17 @@ class Color:
         if write_header:
             RecordDescriptor(BinaryRecordType.BrtColor, len(self)).write(rprocessor)
         
-        color_type = self.color_type
-        if color_type == ColorType.RGBA or self.valid_rgba:
-            rprocessor.write((color_type.value << 1) | 0x01)
-        else:
-            rprocessor.write(color_type.value << 1)
-        
-        color_index = self.color_index
-        rprocessor.write(color_index.value if isinstance(color_index, (PaletteColor, ThemeColor)) else color_index)
-        
-        rprocessor.write(struct.pack('<h', self.shade_amount))
-        rprocessor.write(bytes((self.red, self.green, self.blue, self.alpha)))
+        color_type = self._color_type
+        flags = color_type << 1
+        if color_type == ColorType.RGBA.value or self.valid_rgba:
+            flags |= 0x01
+        rprocessor.write(Color.record.pack(flags, self._color_index, self.shade_amount, self._red, self._green, self._blue, self._alpha))
+    
+    def packed(self, theme=None):
+        return resolve_color(self.key(), theme.colors if theme is not None else None)
+    
+    def key(self):
+        return (self._color_type, self.shade_amount, self._color_index, self.valid_rgba, self._red, self._green, self._blue, self._alpha)
     
     def __str__(self):
         return f'Color: {self.color_type}; i: {self.color_index}; ARGB (valid): {self.alpha}, {self.red}, {self.green}, {self.blue} ({self.valid_rgba}); Shade: {self.shade_amount}'
@@ -438,6 +770,12 @@ class Color:
 
 
 class CellXF:
+    __slots__ = ('parent_index', 'format_id', 'font_index', 'fill_index', 'border_index', 'text_trot', 'indent', '_horizontal_align_type',
+            '_vertical_align_type', 'wrap_text', 'justify_on_last_line', 'shrink_to_fit', 'merged', '_reading_order_type', 'locked', 'hidden',
+            'has_pivot_table_dropdown', 'single_quote_prefix', 'gr_bit', 'repository')
+    
+    record = struct.Struct('<HHHHHBBBBH')
+    
     @staticmethod
     def create_default_named():
         return CellXF(0xffff, 0, 0, 0, 0, 0, 0, HorizontalAlignmentType.GENERAL, VerticalAlignmentType.BOTTOM, False, False,
@@ -450,8 +788,7 @@ class CellXF:
     
     @staticmethod
     def read(stream, *, repository=None):
-        ixfe_parent, i_font, i_fmt, i_fill, ix_border = struct.unpack('<HHHHH', stream.read(10))
-        trot, indent, flags_1, flags_2 = stream.read(4)
+        ixfe_parent, i_fmt, i_font, i_fill, ix_border, trot, indent, flags_1, flags_2, flags_3 = CellXF.record.unpack(stream.read(16))
         
         alc = flags_1 & 0x07
         alcv = (flags_1 & 0x38) >> 3
@@ -466,13 +803,11 @@ class CellXF:
         f_sx_button = flags_2 & 0x40
         f_123_prefix = flags_2 & 0x80
         
-        flags_3 = struct.unpack('<H', stream.read(2))[0]
         xf_grbit_atr = flags_3 & 0x003f
         unused = flags_3 & 0xffc0
         
-        return CellXF(ixfe_parent, i_font, i_fmt, i_fill, ix_border, trot, indent, HorizontalAlignmentType(alc), VerticalAlignmentType(alcv),
-                bool(f_wrap), bool(f_just_last), bool(f_shrink_to_fit), bool(f_merge_cell), ReadingOrderType(i_reading_order), bool(f_locked), bool(f_hidden),
-                bool(f_sx_button), bool(f_123_prefix), xf_grbit_atr, repository=repository)
+        return CellXF(ixfe_parent, i_fmt, i_font, i_fill, ix_border, trot, indent, alc, alcv, bool(f_wrap), bool(f_just_last), bool(f_shrink_to_fit),
+                bool(f_merge_cell), i_reading_order, bool(f_locked), bool(f_hidden), bool(f_sx_button), bool(f_123_prefix), xf_grbit_atr, repository=repository)
     
     
     def __init__(self, parent_index, format_id, font_index, fill_index, border_index, text_trot,
@@ -485,13 +820,13 @@ class CellXF:
         self.border_index = border_index
         self.text_trot = text_trot
         self.indent = indent
-        self.horizontal_align_type = horizontal_align_type
-        self.vertical_align_type = vertical_align_type
+        self._horizontal_align_type = code_of(horizontal_align_type)
+        self._vertical_align_type = code_of(vertical_align_type)
         self.wrap_text = wrap_text
         self.justify_on_last_line = justify_on_last_line
         self.shrink_to_fit = shrink_to_fit
         self.merged = merged
-        self.reading_order_type = reading_order_type
+        self._reading_order_type = code_of(reading_order_type)
         self.locked = locked
         self.hidden = hidden
         self.has_pivot_table_dropdown = has_pivot_table_dropdown
@@ -499,6 +834,10 @@ class CellXF:
         self.gr_bit = gr_bit
         self.repository = repository
     
+    horizontal_align_type = coded('horizontal_align_type', HorizontalAlignmentType)
+    vertical_align_type = coded('vertical_align_type', VerticalAlignmentType)
+    reading_order_type = coded('reading_order_type', ReadingOrderType)
+    
     @property
     def is_style(self):
         return self.parent_index == 0xffff
@@ -509,7 +848,7 @@ class CellXF:
     def set_ignore(self, xf_property, ignore):
         if not self.is_style:
             raise ValueError('CellXF is a (normal) Cell XF.')
-        self.set_gr_bit_val(ignore)
+        self.set_gr_bit_val(xf_property, ignore)
     
     def should_persist(self, xf_property):
         return not self.is_style and self.gr_bit & xf_property.value
@@ -517,7 +856,12 @@ class CellXF:
     def set_persist(self, xf_property, persist):
         if self.is_style:
             raise ValueError('CellXF is a Cell Style XF.')
-        self.set_gr_bit_val(persist)
+        self.set_gr_bit_val(xf_property, persist)
+    
+    def key(self):
+        return (self.parent_index, self.format_id, self.font_index, self.fill_index, self.border_index, self.text_trot, self.indent,
+                self._horizontal_align_type, self._vertical_align_type, self.wrap_text, self.justify_on_last_line, self.shrink_to_fit, self.merged,
+                self._reading_order_type, self.locked, self.hidden, self.has_pivot_table_dropdown, self.single_quote_prefix, self.gr_bit)
     
     def gr_bit_val(self, xf_property):
         return bool(self.gr_bit & xf_property.value)
@@ -533,10 +877,8 @@ class CellXF:
         
         RecordDescriptor(BinaryRecordType.BrtXF, len(self)).write(rprocessor)
         
-        rprocessor.write(struct.pack('<HHHHH', self.parent_index, self.format_id, self.font_index, self.fill_index, self.border_index))
-        
-        flags_1 = self.horizontal_align_type.value
-        flags_1 |= self.vertical_align_type.value << 3
+        flags_1 = self._horizontal_align_type
+        flags_1 |= self._vertical_align_type << 3
         if self.wrap_text:
             flags_1 |= 0x40
         if self.justify_on_last_line:
@@ -547,7 +889,7 @@ class CellXF:
             flags_2 |= 0x01
         if self.merged:
             flags_2 |= 0x02
-        flags_2 |= self.reading_order_type.value << 2
+        flags_2 |= self._reading_order_type << 2
         if self.locked:
             flags_2 |= 0x10
         if self.hidden:
@@ -557,8 +899,8 @@ class CellXF:
         if self.single_quote_prefix:
             flags_2 |= 0x80
         
-        rprocessor.write(bytes((self.text_trot, self.indent, flags_1, flags_2)))
-        rprocessor.write(struct.pack('<H', self.gr_bit))
+        rprocessor.write(CellXF.record.pack(self.parent_index, self.format_id, self.font_index, self.fill_index, self.border_index, self.text_trot,
+                self.indent, flags_1, flags_2, self.gr_bit))
         
         # Skip5
         repository = self.repository
@@ -674,6 +1016,11 @@ class FontList:
         return len(self.fonts)
 
 class Font:
+    __slots__ = ('height', 'italic', 'strikeout', 'outline_only', 'shadow', 'condense', 'extend', 'weight', '_subscript_type', '_underline_type',
+            '_family', '_char_set_type', 'color', '_font_scheme', 'name')
+    
+    record = struct.Struct('<HHHHBBBB')
+    
     @staticmethod
     def create_default():
         return Font(height=220, italic=False, strikeout=False, outline_only=False, shadow=False, condense=False, extend=False, weight=400,
@@ -684,7 +1031,8 @@ class Font:
     def read(stream):
         rprocessor = RecordProcessor.resolve(stream)
         
-        dy_height, gr_bit, bls, sss = struct.unpack('<HHHH', rprocessor.read(8))
+        data = rprocessor.read(21)
+        dy_height, gr_bit, bls, sss, uls, b_family, b_char_set, unused = Font.record.unpack_from(data)
         
         unused_1 = gr_bit & 0x0001
         f_italic = gr_bit & 0x0002
@@ -696,17 +1044,14 @@ class Font:
         f_extend = gr_bit & 0x0080
         unused_3 = gr_bit & 0xff00
         
-        uls, b_family, b_char_set, unused = rprocessor.read(4)
-        
-        brt_color = Color.read(rprocessor)
+        brt_color = Color.decode(data, 12)
         
-        b_font_scheme = rprocessor.read(1)
+        b_font_scheme = data[20]
         
         name = rprocessor.read_xl_w_string(False)
         
         return Font(dy_height, bool(f_italic), bool(f_strikeout), bool(f_outline), bool(f_shadow), bool(f_condense),
-                bool(f_extend), bls, SubscriptType(sss), UnderlineType(uls), FontFamilyType(b_family), CharacterSetType(b_char_set),
-                brt_color, FontSchemeType(b_font_scheme), name)
+                bool(f_extend), bls, sss, uls, b_family, b_char_set, brt_color, b_font_scheme, name)
     
     def __init__(self, height, italic, strikeout, outline_only, shadow, condense, extend, weight, subscript_type, underline_type, family, 
             char_set_type, color, font_scheme, name):
@@ -718,14 +1063,24 @@ class Font:
         self.condense = condense
         self.extend = extend
         self.weight = weight
-        self.subscript_type = subscript_type
-        self.underline_type = underline_type
-        self.family = family
-        self.char_set_type = char_set_type
+        self._subscript_type = code_of(subscript_type)
+        self._underline_type = code_of(underline_type)
+        self._family = code_of(family)
+        self._char_set_type = code_of(char_set_type)
         self.color = color
-        self.font_scheme = font_scheme
+        self._font_scheme = code_of(font_scheme)
         self.name = name
     
+    subscript_type = coded('subscript_type', SubscriptType)
+    underline_type = coded('underline_type', UnderlineType)
+    family = coded('family', FontFamilyType)
+    char_set_type = coded('char_set_type', CharacterSetType)
+    font_scheme = coded('font_scheme', FontSchemeType)
+    
+    def key(self):
+        return (self.height, self.italic, self.strikeout, self.outline_only, self.shadow, self.condense, self.extend, self.weight, self._subscript_type,
+                self._underline_type, self._family, self._char_set_type, self.color.key(), self._font_scheme, self.name)
+    
     def __str__(self):
         result = [f'Font: {self.name}']
         result.append(f'    height: {self.height}')
@@ -746,7 +1101,8 @@ class Font:
     
     def write(self, stream):
         weight = self.weight
-        if not 0x0190 <= weight <= 0x03e8
+        if not 0x0190 <= weight <= 0x03e8:
+            raise ValueError(f'Font weight must be between {0x0190} and {0x03e8}: {weight}')
         
         rprocessor = RecordProcessor.resolve(stream)
         
@@ -766,10 +1122,9 @@ class Font:
         if self.extend:
             gr_bit |= 0x0080
         
-        rprocessor.write(struct.pack('<HHHH', self.height, gr_bit, weight, self.subscript_type.value))
-        rprocessor.write(bytes((self.underline_type.value, self.family.value, self.char_set_type.value, 0)))
+        rprocessor.write(Font.record.pack(self.height, gr_bit, weight, self._subscript_type, self._underline_type, self._family, self._char_set_type, 0))
         self.color.write(rprocessor, False)
-        rprocessor.write(self.font_scheme.value)
+        rprocessor.write(self._font_scheme)
         rprocessor.write_xl_w_string(self.name, False)
         
     
@@ -848,6 +1203,12 @@ class StyleInfo:
         return '\n'.join(result)
 
 class Fill:
+    __slots__ = ('_fill_type', 'foreground_color', 'background_color', '_gradient_type', 'gradient_angle', 'gradient_fill_left', 'gradient_fill_right',
+            'gradient_fill_top', 'gradient_fill_bottom', 'gradient_stops')
+    
+    record = struct.Struct('<I8s8sIdddddI')
+    gradient = struct.Struct('<IdddddI')
+    
     @staticmethod
     def create_default():
         return Fill(fill_type=FillType.NONE, foreground_color=Color(ColorType.PALETTE, 0, PaletteColor.icvForeground, True, 0, 0, 0, 255), 
@@ -856,28 +1217,22 @@ class Fill:
     
     @staticmethod
     def read(stream):
-        fls = struct.unpack('<I', stream.read(4))[0]
-        
-        brt_color_fore = Color.read(stream)
-        brt_color_back = Color.read(stream)
-        
-        i_gradient_type, xnum_degree, xnum_fill_to_left, xnum_fill_to_right, xnum_fill_to_top, \
-                xnum_fill_to_bottom, c_num_stop = struct.unpack('<IdddddI', stream.read(48))
+        fls, brt_color_fore, brt_color_back, i_gradient_type, xnum_degree, xnum_fill_to_left, xnum_fill_to_right, xnum_fill_to_top, \
+                xnum_fill_to_bottom, c_num_stop = Fill.record.unpack(stream.read(68))
         
         xfill_gradient_stops = []
         for i in range(c_num_stop):
-            brt_color = Color.read(stream)
-            xnum_position = struct.unpack('<d', stream.read(8))[0]
+            xfill_gradient_stops.append(GradientStop.read(stream))
         
-        return Fill(FillType(fls), brt_color_fore, brt_color_back, GradientType(i_gradient_type), xnum_degree, xnum_fill_to_left, xnum_fill_to_right,
+        return Fill(fls, Color.decode(brt_color_fore), Color.decode(brt_color_back), i_gradient_type, xnum_degree, xnum_fill_to_left, xnum_fill_to_right,
                 xnum_fill_to_top, xnum_fill_to_bottom, xfill_gradient_stops)
     
     def __init__(self, fill_type, foreground_color, background_color, gradient_type, gradient_angle, gradient_fill_left, gradient_fill_right, 
             gradient_fill_top, gradient_fill_bottom, gradient_stops):
-        self.fill_type = fill_type
+        self._fill_type = code_of(fill_type)
         self.foreground_color = foreground_color
         self.background_color = background_color
-        self.gradient_type = gradient_type
+        self._gradient_type = code_of(gradient_type)
         self.gradient_angle = gradient_angle
         self.gradient_fill_left = gradient_fill_left
         self.gradient_fill_right = gradient_fill_right
@@ -885,20 +1240,27 @@ class Fill:
         self.gradient_fill_bottom = gradient_fill_bottom
         self.gradient_stops = gradient_stops
     
+    fill_type = coded('fill_type', FillType)
+    gradient_type = coded('gradient_type', GradientType)
+    
     def write(self, stream):
         RecordDescriptor(BinaryRecordType.BrtFill, len(self)).write(stream)
         
-        stream.write(struct.pack('<I', self.fill_type.value))
+        stream.write(struct.pack('<I', self._fill_type))
         self.foreground_color.write(stream)
         self.background_color.write(stream)
         
         gradient_stops = self.gradient_stops
-        stream.write(struct.pack('<IdddddI', self.gradient_type.value, self.gradient_angle, self.gradient_fill_left, self.gradient_fill_right,
+        stream.write(Fill.gradient.pack(self._gradient_type, self.gradient_angle, self.gradient_fill_left, self.gradient_fill_right,
                 self.gradient_fill_top, self.gradient_fill_bottom, len(gradient_stops)))
         
         for gradient_stop in gradient_stops:
             gradient_stop.write(stream)
     
+    def key(self):
+        return (self._fill_type, self.foreground_color.key(), self.background_color.key(), self._gradient_type, self.gradient_angle, self.gradient_fill_left,
+                self.gradient_fill_right, self.gradient_fill_top, self.gradient_fill_bottom, tuple(i.key() for i in self.gradient_stops))
+    
     def __len__(self):
         return 4 + len(self.foreground_color) + len(self.background_color) + 48 + sum(len(i) for i in self.gradient_stops)
     
@@ -916,11 +1278,12 @@ class Fill:
         return '\n'.join(result)
 
 class GradientStop:
+    __slots__ = ('color', 'position')
+    
     @staticmethod
     def read(stream):
-        brt_color = Color.read(stream)
-        xnum_position = struct.unpack('<d', stream.read(8))[0]
-        return GradientStop(brt_color, xnum_position)
+        data = stream.read(16)
+        return GradientStop(Color.decode(data), struct.unpack_from('<d', data, 8)[0])
 
     def __init__(self, color, position):
         self.color = color
@@ -930,6 +1293,9 @@ class GradientStop:
         self.color.write(stream)
         stream.write(struct.pack('<d', self.position))
     
+    def key(self):
+        return (self.color.key(), self.position)
+    
     def __len__(self):
         return len(self.color) + 8
     
@@ -937,25 +1303,35 @@ class GradientStop:
         return f'(color: {self.color}, position: {self.position}'
 
 class BorderDefinition:
+    __slots__ = ('_border_type', 'color')
+    
     @staticmethod
     def read(stream):
-        dg, reserved = stream.read(2)
-        brt_color = Color.read(stream)
-        
-        return BorderDefinition(BorderType(dg), brt_color)
+        return BorderDefinition.decode(stream.read(10))
+    
+    @staticmethod
+    def decode(data, offset=0):
+        return BorderDefinition(data[offset], Color.decode(data, offset + 2))
     
     def __init__(self, border_type, color):
-        self.border_type = border_type
+        self._border_type = code_of(border_type)
         self.color = color
     
+    border_type = coded('border_type', BorderType)
+    
     def write(self, stream):
-        stream.write(bytes((self.border_type.value, 0)))
+        stream.write(bytes((self._border_type, 0)))
         self.color.write(stream)
     
+    def key(self):
+        return (self._border_type, self.color.key())
+    
     def __str__(self):
         return f'(border_type: {self.border_type}, color: {self.color})'
 
 class Border:
+    __slots__ = ('has_diagonal_down', 'has_diagonal_up', 'top', 'bottom', 'left', 'right', 'diagonal')
+    
     @staticmethod
     def create_default():
         return Border(has_diagonal_down=False, has_diagonal_up=False, top=BorderDefinition(BorderType.NONE, Color(ColorType.AUTO, 0, 0, True, 0, 0, 0, 0)), 
@@ -966,18 +1342,18 @@ class Border:
     
     @staticmethod
     def read(stream):
-        rprocessor = RecordProcessor.resolve(stream)
+        data = stream.read(51)
         
-        flags = rprocessor.read(1)
+        flags = data[0]
         f_bdr_diag_down = flags & 0x01
         f_bdr_diag_up = flags & 0x02
         reserved = 0xfc
         
-        bxlf_top = BorderDefinition.read(stream)
-        bxlf_bottom = BorderDefinition.read(stream)
-        bxlf_left = BorderDefinition.read(stream)
-        bxlf_right = BorderDefinition.read(stream)
-        bxlf_diag = BorderDefinition.read(stream)
+        bxlf_top = BorderDefinition.decode(data, 1)
+        bxlf_bottom = BorderDefinition.decode(data, 11)
+        bxlf_left = BorderDefinition.decode(data, 21)
+        bxlf_right = BorderDefinition.decode(data, 31)
+        bxlf_diag = BorderDefinition.decode(data, 41)
         
         return Border(bool(f_bdr_diag_down), bool(f_bdr_diag_up), bxlf_top, bxlf_bottom, bxlf_left, bxlf_right, bxlf_diag)
     
@@ -1008,6 +1384,9 @@ class Border:
         self.right.write(stream)
         self.diagonal.write(stream)
     
+    def key(self):
+        return (self.has_diagonal_down, self.has_diagonal_up, self.top.key(), self.bottom.key(), self.left.key(), self.right.key(), self.diagonal.key())
+    
     def __len__(self):
         return 51
     
@@ -0,0 +1,42 @@
+
+import xml.etree.ElementTree as ET
+
+
+drawingml_ns = 'http://schemas.openxmlformats.org/drawingml/2006/main'
+
+
+class ThemePart:
+    # Theme color indexes used by the workbook swap the dark/light pairs relative to the order of the clrScheme elements:
+    # Excel draws index 0 with lt1 and index 1 with dk1 (the default font is theme 1, black text). The ThemeColor names in
+    # btypes follow the [MS-XLSB] wording instead, so ThemeColor.DK_1 (0x00) resolves to lt1 and ThemeColor.LT_1 to dk1.
+    scheme_slots = ('lt1', 'dk1', 'lt2', 'dk2', 'accent1', 'accent2', 'accent3', 'accent4', 'accent5', 'accent6', 'hlink', 'folHlink')
+    
+    @staticmethod
+    def read(stream):
+        root = ET.parse(stream).getroot()
+        
+        clr_scheme = root.find(f'.//{{{drawingml_ns}}}clrScheme')
+        if clr_scheme is None:
+            return ThemePart(None, (None,) * len(ThemePart.scheme_slots))
+        
+        scheme = {}
+        for slot in clr_scheme:
+            if not len(slot):
+                continue
+            color_el = slot[0]
+            tag = color_el.tag.rsplit('}', 1)[-1]
+            if tag == 'srgbClr':
+                rgb = color_el.get('val')
+            elif tag == 'sysClr':
+                rgb = color_el.get('lastClr')
+            else:
+                rgb = None
+            
+            if rgb:
+                scheme[slot.tag.rsplit('}', 1)[-1]] = (int(rgb, 16) << 8) | 0xff
+        
+        return ThemePart(clr_scheme.get('name'), tuple(scheme.get(slot) for slot in ThemePart.scheme_slots))
+    
+    def __init__(self, scheme_name, colors):
+        self.scheme_name = scheme_name
+        self.colors = colors
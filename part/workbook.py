@@ -1,4 +1,5 @@
 
+import io
 import struct
 from enum import Enum
 
@@ -6,6 +7,11 @@ from btypes import BinaryRecordType
 from bprocessor import UnexpectedRecordException, RecordProcessor, RecordRepository, RecordDescriptor
 
 
+# Each supporting link (SUPBOOK) starts with one of these; BrtExternSheet entries index them in order.
+sup_book_types = frozenset((BinaryRecordType.BrtSupSelf, BinaryRecordType.BrtSupSame, BinaryRecordType.BrtSupBookSrc, BinaryRecordType.BrtSupAddin))
+local_sup_book_types = frozenset((BinaryRecordType.BrtSupSelf, BinaryRecordType.BrtSupSame))
+
+
 class WorkbookPart:
     @staticmethod
     def read(stream, for_update=False):
@@ -41,17 +47,92 @@ class WorkbookPart:
             raise UnexpectedRecordException(r, BinaryRecordType.BrtEndBundleShs)
         
         
-        # Skip 2
-        rprocessor.skip_until(BinaryRecordType.BrtEndBook, repository=repository)
+        # Skip 2; supporting links, BrtExternSheet and BrtName are decoded on the way through and still kept for writing
+        names = NameTable()
+        sup_books = []
+        extern_sheet = None
+        r = rprocessor.read_descriptor()
+        while r.rtype != BinaryRecordType.BrtEndBook:
+            if r.rtype == BinaryRecordType.BrtName or r.rtype == BinaryRecordType.BrtExternSheet:
+                data = rprocessor.read(r.size, single_as_int=False)
+                repository.store(r, data)
+                if r.rtype == BinaryRecordType.BrtName:
+                    names.add(DefinedName.read(io.BytesIO(data)))
+                else:
+                    extern_sheet = ExternSheet.read(io.BytesIO(data))
+            else:
+                if r.rtype in sup_book_types:
+                    sup_books.append(r.rtype)
+                r.skip(rprocessor, repository)
+            r = rprocessor.read_descriptor()
         repository.push_current()
         
-        return WorkbookPart(props, sheet_refs, repository=repository)
+        return WorkbookPart(props, sheet_refs, names=names, sup_books=sup_books, extern_sheet=extern_sheet, repository=repository)
+    
+    @staticmethod
+    def read_sheet_refs(stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        
+        # Begin
+        r = rprocessor.read_descriptor()
+        if r.rtype != BinaryRecordType.BrtBeginBook:
+            raise UnexpectedRecordException(r, BinaryRecordType.BrtBeginBook)
+        
+        # Workbook Properties
+        props = None
+        r = rprocessor.skip_until(BinaryRecordType.BrtWbProp, BinaryRecordType.BrtBeginBundleShs)
+        if r.rtype == BinaryRecordType.BrtWbProp:
+            props = WorkbookProperties.read(rprocessor)
+            rprocessor.skip_until(BinaryRecordType.BrtBeginBundleShs)
+        
+        # Sheet References; nothing past the end of the bundle is read
+        sheet_refs = []
+        r = rprocessor.read_descriptor()
+        while r.rtype == BinaryRecordType.BrtBundleSh:
+            sheet_refs.append(BundledSheet.read(rprocessor))
+            r = rprocessor.read_descriptor()
+        
+        if r.rtype != BinaryRecordType.BrtEndBundleShs:
+            raise UnexpectedRecordException(r, BinaryRecordType.BrtEndBundleShs)
+        
+        return props, sheet_refs
     
-    def __init__(self, props, sheet_refs, *, repository=None):
+    def __init__(self, props, sheet_refs, *, names=None, sup_books=None, extern_sheet=None, repository=None):
         self.props = props
         self.sheet_refs = sheet_refs
+        self.names = names if names is not None else NameTable()
+        self.sup_books = sup_books if sup_books is not None else []
+        self.extern_sheet = extern_sheet
         self.repository = repository
     
+    def sheet_index(self, sheet_name):
+        folded = sheet_name.casefold()
+        for i, sheet_ref in enumerate(self.sheet_refs):
+            if sheet_ref.sheet_name.casefold() == folded:
+                return i
+        raise ValueError(f'No sheet named {sheet_name}')
+    
+    def resolve_name(self, name, sheet=None):
+        sheet_index = self.sheet_index(sheet) if isinstance(sheet, str) else sheet
+        defined_name = self.names.get(name, sheet_index)
+        if defined_name is None:
+            raise ValueError(f'No defined name {name}')
+        
+        area = defined_name.area
+        if area is None:
+            raise ValueError(f'Defined name does not refer to a single cell range: {name}')
+        
+        xtis = self.extern_sheet.xtis if self.extern_sheet else ()
+        if area.ixti >= len(xtis):
+            raise ValueError(f'Defined name refers to a missing BrtExternSheet entry {area.ixti}: {name}')
+        xti = xtis[area.ixti]
+        if xti.sup_book >= len(self.sup_books) or self.sup_books[xti.sup_book] not in local_sup_book_types:
+            raise ValueError(f'Defined name refers to another workbook: {name}')
+        if xti.tab_first != xti.tab_last or not 0 <= xti.tab_first < len(self.sheet_refs):
+            raise ValueError(f'Defined name does not refer to a single sheet: {name}')
+        
+        return self.sheet_refs[xti.tab_first], area
+    
     def write(self, stream):
         rprocessor = RecordProcessor.resolve(stream)
         repository = self.repository
@@ -155,6 +236,187 @@ class BundledSheet:
         return 8 + RecordProcessor.len_xl_w_string(self.rel_id) + RecordProcessor.len_xl_w_string(self.sheet_name, False)
 
 
+class Xti:
+    # Sheet range an ixti (index into BrtExternSheet) resolves to; itab -2 is workbook level and -1 a deleted sheet.
+    @staticmethod
+    def read(stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        sup_book, tab_first, tab_last = struct.unpack('<Iii', rprocessor.read(12))
+        return Xti(sup_book, tab_first, tab_last)
+    
+    def __init__(self, sup_book, tab_first, tab_last):
+        self.sup_book = sup_book
+        self.tab_first = tab_first
+        self.tab_last = tab_last
+    
+    def write(self, stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        rprocessor.write(struct.pack('<Iii', self.sup_book, self.tab_first, self.tab_last))
+    
+    def __len__(self):
+        return 12
+
+class ExternSheet:
+    @staticmethod
+    def read(stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        count = struct.unpack('<I', rprocessor.read(4))[0]
+        return ExternSheet([Xti.read(rprocessor) for i in range(count)])
+    
+    def __init__(self, xtis):
+        self.xtis = xtis
+    
+    def write(self, stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        rprocessor.write(struct.pack('<I', len(self.xtis)))
+        for xti in self.xtis:
+            xti.write(rprocessor)
+    
+    def __len__(self):
+        return 4 + 12 * len(self.xtis)
+
+
+class NameArea:
+    # Single contiguous block a defined name refers to, still relative to its BrtExternSheet entry.
+    @staticmethod
+    def parse(formula):
+        if not formula:
+            return None
+        
+        ptg = formula[0]
+        if ptg < 0x20:
+            return None
+        ptg &= 0x1f
+        
+        if ptg == 0x1b and len(formula) == 15:
+            ixti, row_first, row_last, col_first, col_last = struct.unpack_from('<HiiHH', formula, 1)
+            return NameArea(ixti, row_first, row_last, col_first & 0x3fff, col_last & 0x3fff)
+        elif ptg == 0x1a and len(formula) == 9:
+            ixti, row, col = struct.unpack_from('<HiH', formula, 1)
+            return NameArea(ixti, row, row, col & 0x3fff, col & 0x3fff)
+        return None
+    
+    def __init__(self, ixti, row_first, row_last, col_first, col_last):
+        self.ixti = ixti
+        self.row_first = row_first
+        self.row_last = row_last
+        self.col_first = col_first
+        self.col_last = col_last
+    
+    def __str__(self):
+        return f'{self.ixti}!R{self.row_first + 1}C{self.col_first + 1}:R{self.row_last + 1}C{self.col_last + 1}'
+
+
+class DefinedName:
+    workbook_scope = 0xffffffff
+    
+    @staticmethod
+    def read(stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        
+        flags, key, itab = struct.unpack('<IBI', rprocessor.read(9))
+        f_hidden = flags & 0x00000001
+        f_func = flags & 0x00000002
+        f_proc = flags & 0x00000008
+        f_builtin = flags & 0x00000020
+        
+        name = rprocessor.read_xl_w_string(False)
+        
+        # NameParsedFormula
+        cce = struct.unpack('<I', rprocessor.read(4))[0]
+        formula = rprocessor.read(cce, single_as_int=False)
+        cb = struct.unpack('<I', rprocessor.read(4))[0]
+        extra = rprocessor.read(cb, single_as_int=False)
+        
+        comment = rprocessor.read_xl_w_string()
+        proc_strings = None
+        if f_proc:
+            proc_strings = tuple(rprocessor.read_xl_w_string() for i in range(4))
+        
+        return DefinedName(name, None if itab == DefinedName.workbook_scope else itab, formula, extra, comment=comment, hidden=bool(f_hidden), builtin=bool(f_builtin),
+                is_function=bool(f_func), flags=flags, key=key, proc_strings=proc_strings)
+    
+    def __init__(self, name, sheet_index, formula, extra=b'', *, comment=None, hidden=False, builtin=False, is_function=False, flags=0, key=0, proc_strings=None):
+        self.name = name
+        self.sheet_index = sheet_index
+        self.formula = formula
+        self.extra = extra
+        self.comment = comment
+        self.hidden = hidden
+        self.builtin = builtin
+        self.is_function = is_function
+        self.flags = flags
+        self.key = key
+        self.proc_strings = proc_strings
+    
+    @property
+    def area(self):
+        return NameArea.parse(self.formula)
+    
+    def write(self, stream):
+        rprocessor = RecordProcessor.resolve(stream)
+        
+        flags = self.flags & ~0x00000023
+        if self.hidden:
+            flags |= 0x00000001
+        if self.is_function:
+            flags |= 0x00000002
+        if self.builtin:
+            flags |= 0x00000020
+        if self.proc_strings is not None:
+            flags |= 0x00000008
+        else:
+            flags &= ~0x00000008
+        
+        rprocessor.write(struct.pack('<IBI', flags, self.key, DefinedName.workbook_scope if self.sheet_index is None else self.sheet_index))
+        rprocessor.write_xl_w_string(self.name, False)
+        rprocessor.write(struct.pack('<I', len(self.formula)))
+        rprocessor.write(self.formula)
+        rprocessor.write(struct.pack('<I', len(self.extra)))
+        rprocessor.write(self.extra)
+        rprocessor.write_xl_w_string(self.comment)
+        if self.proc_strings is not None:
+            for value in self.proc_strings:
+                rprocessor.write_xl_w_string(value)
+    
+    def __len__(self):
+        result = 9 + RecordProcessor.len_xl_w_string(self.name, False) + 8 + len(self.formula) + len(self.extra) + RecordProcessor.len_xl_w_string(self.comment)
+        if self.proc_strings is not None:
+            result += sum(RecordProcessor.len_xl_w_string(value) for value in self.proc_strings)
+        return result
+    
+    def __str__(self):
+        scope = 'Workbook' if self.sheet_index is None else f'Sheet {self.sheet_index}'
+        return f'{self.name} ({scope}): {self.area or self.formula.hex()}'
+
+
+class NameTable:
+    def __init__(self, names=None):
+        self.names = []
+        self.index = {}
+        for name in (names or ()):
+            self.add(name)
+    
+    def add(self, name):
+        self.names.append(name)
+        # Names are case-insensitive; the first record for a (scope, name) pair wins, as in Excel.
+        self.index.setdefault((name.sheet_index, name.name.casefold()), name)
+    
+    def get(self, name, sheet_index=None):
+        folded = name.casefold()
+        if sheet_index is not None:
+            result = self.index.get((sheet_index, folded))
+            if result is not None:
+                return result
+        return self.index.get((None, folded))
+    
+    def __iter__(self):
+        return iter(self.names)
+    
+    def __len__(self):
+        return len(self.names)
+
+
 class UpdateLinksBehavior(Enum):
     APP_SPECIFIC = 0x0
     MANUAL_UPDATE = 0x1
@@ -1,10 +1,13 @@
 
+import io
 import math
 import struct
+from array import array
+from bisect import bisect_left
 
 import btypes
 from btypes import BinaryRecordType
-from bprocessor import UnexpectedRecordException, RecordProcessor, RecordRepository, RecordDescriptor
+from bprocessor import UnexpectedRecordException, RecordProcessor, RecordRepository, RecordDescriptor, SpanWriter
 
 
 error_lookup = {
@@ -26,6 +29,9 @@ def check_poll(self, stream):
     if repository:
         repository.write_poll(stream)
 
+def field_values(obj):
+    return tuple(vars(obj).values())
+
 
 class WorksheetPart:
     @staticmethod
@@ -37,6 +43,25 @@ class WorksheetPart:
         rprocessor = RecordProcessor.resolve(stream)
         repository = RecordRepository(for_update)
         
+        sheet_dimension, col_info = WorksheetPart.read_preamble(rprocessor, repository=repository)
+        
+        # Rows
+        rows = list(WorksheetPart.iter_rows(rprocessor, repository=repository))
+        
+        
+        # Skip 7
+        rprocessor.skip_until(BinaryRecordType.BrtEndSheet, repository=repository)
+        repository.push_current()
+        
+        return WorksheetPart(sheet_dimension, col_info, rows, repository=repository)
+    
+    
+    @staticmethod
+    def read_preamble(stream, *, repository=None):
+        rprocessor = RecordProcessor.resolve(stream)
+        if repository is None:
+            repository = RecordRepository(False)
+        
         # Begin
         r = rprocessor.read_descriptor()
         if r.rtype != BinaryRecordType.BrtBeginSheet:
@@ -85,8 +110,15 @@ class WorksheetPart:
         if r.rtype != BinaryRecordType.BrtBeginSheetData:
             raise UnexpectedRecordException(r, BinaryRecordType.BrtBeginSheetData)
         
-        # Rows
-        rows = []
+        return sheet_dimension, col_info
+    
+    @staticmethod
+    def iter_rows(stream, *, repository=None):
+        rprocessor = RecordProcessor.resolve(stream)
+        if repository is None:
+            repository = RecordRepository(False)
+        source = repository.source_for(rprocessor)
+        
         r = rprocessor.read_descriptor()
         rows_done = False
         while not rows_done:
@@ -102,6 +134,7 @@ class WorksheetPart:
             
             if r.rtype != BinaryRecordType.BrtRowHdr:
                 raise UnexpectedRecordException(r, BinaryRecordType.BrtRowHdr)
+            row_start = RecordRepository.find_header(source, rprocessor.stream.tell(), r) if source is not None else None
             row_header = RowHeader.read(rprocessor)
             
             # Cells
@@ -173,17 +206,66 @@ class WorksheetPart:
                             BinaryRecordType.BrtFmlaBool, BinaryRecordType.BrtFmlaError, BinaryRecordType.BrtShrFmla, BinaryRecordType.BrtArrFmla, BinaryRecordType.BrtTable)
                 
                 r = rprocessor.read_descriptor()
-                
-                
-            rows.append(Row(row_header, cells, repository=repository))
+            
+            # Clean rows are written back from the source bytes, from the row header through the last cell.
+            source_span = None
+            if row_start is not None:
+                row_end = RecordRepository.find_header(source, rprocessor.stream.tell(), r)
+                if row_end is not None:
+                    source_span = (source, row_start, row_end)
+            
+            yield Row(row_header, cells, repository=repository, source_span=source_span)
+    
+    @staticmethod
+    def scan_rows(stream):
+        rprocessor = RecordProcessor.resolve(stream)
         
+        row_indices = array('i')
+        offsets = array('Q')
+        states = array('Q')
+        for offset, r in rprocessor.scan(BinaryRecordType.BrtRowHdr):
+            row_indices.append(struct.unpack('<i', rprocessor.read(4))[0])
+            offsets.append(offset)
+            states.append(rprocessor.save_state())
         
-        # Skip 7
-        rprocessor.skip_until(BinaryRecordType.BrtEndSheet, repository=repository)
-        repository.push_current()
+        return row_indices, offsets, states
+    
+    @staticmethod
+    def split_rows(data, count):
+        rprocessor = RecordProcessor(io.BytesIO(data))
+        WorksheetPart.read_preamble(rprocessor)
+        
+        offsets = []
+        states = []
+        end = len(data)
+        for offset, r in rprocessor.scan(BinaryRecordType.BrtRowHdr, BinaryRecordType.BrtEndSheetData):
+            if r.rtype == BinaryRecordType.BrtEndSheetData:
+                end = offset
+                break
+            offsets.append(offset)
+            states.append(tuple(rprocessor.read_stack))
         
-        return WorksheetPart(sheet_dimension, col_info, rows, repository=repository)
-
+        if not offsets:
+            return []
+        
+        # Boundaries at the first row at or after each even byte split.
+        bounds = [0]
+        size = end - offsets[0]
+        for i in range(1, count):
+            j = bisect_left(offsets, offsets[0] + size * i // count)
+            if j < len(offsets) and j > bounds[-1]:
+                bounds.append(j)
+        
+        terminator = io.BytesIO()
+        RecordDescriptor(BinaryRecordType.BrtEndSheetData).write(terminator)
+        terminator = terminator.getvalue()
+        
+        chunks = []
+        for k, j in enumerate(bounds):
+            chunk_end = offsets[bounds[k + 1]] if k + 1 < len(bounds) else end
+            chunks.append((data[offsets[j]:chunk_end] + terminator, states[j]))
+        return chunks
+    
 
     def __init__(self, sheet_dimension, col_info, rows, *, repository=None):
         self.sheet_dimension = sheet_dimension if sheet_dimension else SheetDimension(0, 0, 0, 0)
@@ -194,8 +276,12 @@ class WorksheetPart:
     def write(self, stream):
         rprocessor = RecordProcessor.resolve(stream)
         repository = self.repository
+        span_writer = None
         if repository:
             repository.begin_write()
+            if repository.for_update:
+                span_writer = SpanWriter(rprocessor.stream)
+                rprocessor = RecordProcessor(span_writer)
         
         # Begin
         RecordDescriptor(BinaryRecordType.BrtBeginSheet).write(rprocessor)
@@ -232,6 +318,8 @@ class WorksheetPart:
             repository.write_poll(rprocessor)
         
         RecordDescriptor(BinaryRecordType.BrtEndSheet).write(rprocessor)
+        if span_writer:
+            span_writer.flush()
         if repository:
             repository.close()
 
@@ -323,6 +411,10 @@ class RkCell:
     def value(self):
         return self.num
     
+    @value.setter
+    def value(self, value):
+        self.num = value
+    
     def write(self, stream):
         check_poll(self, stream)
         RecordDescriptor(BinaryRecordType.BrtCellRk, len(self)).write(stream)
@@ -370,6 +462,10 @@ class ErrorCell:
     def value(self):
         return self.error
     
+    @value.setter
+    def value(self, value):
+        self.error = value
+    
     @property
     def error(self):
         return error_lookup[self.error_number]
@@ -410,6 +506,10 @@ class BoolCell:
     def value(self):
         return self.val
     
+    @value.setter
+    def value(self, value):
+        self.val = value
+    
     def write(self, stream):
         check_poll(self, stream)
         RecordDescriptor(BinaryRecordType.BrtCellBool, len(self)).write(stream)
@@ -442,6 +542,10 @@ class RealCell:
     def value(self):
         return self.num
     
+    @value.setter
+    def value(self, value):
+        self.num = value
+    
     def write(self, stream):
         check_poll(self, stream)
         RecordDescriptor(BinaryRecordType.BrtCellReal, len(self)).write(stream)
@@ -506,6 +610,10 @@ class InlineStringCell:
     def value(self):
         return self.val
     
+    @value.setter
+    def value(self, value):
+        self.val = value
+    
     def write(self, stream):
         check_poll(self, stream)
         RecordDescriptor(BinaryRecordType.BrtCellSt, len(self)).write(stream)
@@ -517,10 +625,25 @@ class InlineStringCell:
 
 
 class Row:
-    def __init__(self, header, cells, *, repository=None):
+    def __init__(self, header, cells, *, repository=None, source_span=None):
         self.header = header
         self.cells = cells
         self.repository = repository
+        self.source_span = source_span
+        self.source_fields = self.fields() if source_span else None
+    
+    def fields(self):
+        # Everything write() encodes. Only rows read for update keep a copy, so the read-only path stays plain attributes.
+        header = self.header
+        return (field_values(header), tuple((sp.col_first, sp.col_last) for sp in header.col_spans),
+                tuple((cell, field_values(cell), field_values(cell.header)) for cell in self.cells))
+    
+    @property
+    def dirty(self):
+        return self.source_span is None or self.fields() != self.source_fields
+    
+    def mark_dirty(self):
+        self.source_span = None
     
     @property
     def col_range(self):
@@ -530,6 +653,12 @@ class Row:
     def write(self, stream):
         check_poll(self, stream)
         
+        if not self.dirty:
+            # The source bytes already include the cell-level skipped records, so drop their copies.
+            self.repository.drop_poll(len(self.source_fields[2]))
+            RecordProcessor.resolve(stream).write_span(*self.source_span)
+            return
+        
         self.header.write(stream)
         for cell in self.cells:
             cell.write(stream)
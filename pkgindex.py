@@ -0,0 +1,199 @@
+
+import os
+import sys
+import json
+import struct
+import hashlib
+from array import array
+from bisect import bisect_left
+from zipfile import ZipFile
+
+from btypes import RelationshipType, ContentType
+from ooxmlpkg import PartInfo, PartRelationship, part_name
+from part.sst import SharedStringsPart
+from part.worksheet import WorksheetPart
+
+
+class InvalidIndexException(Exception):
+    pass
+
+
+class PackageIndex:
+    
+    magic = b'XLSBIDX\x02'
+    
+    @staticmethod
+    def sidecar_path(fname):
+        return f'{fname}.idx'
+    
+    @staticmethod
+    def package_key(fname):
+        st = os.stat(fname)
+        
+        # Central directory, as seen through the member list.
+        cd_hash = hashlib.sha1()
+        with ZipFile(fname) as f:
+            for info in f.infolist():
+                cd_hash.update(info.filename.encode('utf-8'))
+                cd_hash.update(struct.pack('<IQQQ', info.CRC, info.compress_size, info.file_size, info.header_offset))
+        
+        return [st.st_size, st.st_mtime_ns, cd_hash.hexdigest()]
+    
+    @staticmethod
+    def build(pkg):
+        key = PackageIndex.package_key(pkg.fname)
+        
+        parts = {}
+        row_indices = {}
+        sst_paths = set()
+        
+        # Marked on push so a part reached through several relationships is only scanned once
+        pending = [pkg.get_part_info()]
+        seen = {part_name(pending[0])}
+        while pending:
+            part_info = pending.pop()
+            part_info.relationships = list(part_info.relationships)
+            name = part_name(part_info)
+            parts[name] = part_info
+            
+            if part_info.content_type == ContentType.WORKSHEET:
+                with pkg.open_part(part_info) as f:
+                    row_indices[name] = WorksheetPart.scan_rows(f)
+            
+            for rel in part_info.relationships:
+                target = part_name(rel)
+                if target in seen:
+                    continue
+                seen.add(target)
+                try:
+                    rel_info = pkg.get_part_info(target)
+                except ValueError:
+                    # No content type; get_part_info would raise for it with or without the index
+                    continue
+                if rel_info is None:
+                    continue
+                if rel.rtype == RelationshipType.SHARED_STRINGS:
+                    sst_paths.add(target)
+                pending.append(rel_info)
+        
+        sst_offsets = {}
+        for name in sst_paths:
+            with pkg.open_part(name) as f:
+                sst_offsets[name] = SharedStringsPart.scan_items(f)
+        
+        return PackageIndex(pkg.fname, key, parts, row_indices, sst_offsets)
+    
+    @staticmethod
+    def load(fname, sidecar=None):
+        if sidecar is None:
+            sidecar = PackageIndex.sidecar_path(fname)
+        
+        try:
+            f = open(sidecar, 'rb')
+        except FileNotFoundError:
+            return None
+        
+        with f:
+            try:
+                index = PackageIndex.read(f, fname)
+            except (InvalidIndexException, ValueError, KeyError, struct.error):
+                return None
+        
+        if index.key != PackageIndex.package_key(fname):
+            return None
+        return index
+    
+    @staticmethod
+    def open(pkg, sidecar=None):
+        index = PackageIndex.load(pkg.fname, sidecar)
+        if index is None:
+            index = PackageIndex.build(pkg)
+            try:
+                index.save(sidecar)
+            except OSError:
+                pass
+        
+        pkg.part_directory = index.parts
+        return index
+    
+    @staticmethod
+    def read(stream, fname):
+        if stream.read(len(PackageIndex.magic)) != PackageIndex.magic:
+            raise InvalidIndexException('Not a package index.')
+        
+        header_len = struct.unpack('<I', stream.read(4))[0]
+        header = json.loads(stream.read(header_len).decode('utf-8'))
+        if header['byteorder'] != sys.byteorder:
+            raise InvalidIndexException(f'Index written on a {header["byteorder"]}-endian machine.')
+        
+        parts = {}
+        for path, content_type, rels in header['parts']:
+            relationships = [PartRelationship(rid, RelationshipType.resolve(rtype), target, raw_target) for rid, rtype, target, raw_target in rels]
+            parts[part_name(path)] = PartInfo(path, ContentType.resolve(content_type) if content_type else None, relationships)
+        
+        def read_array(typecode, count):
+            result = array(typecode)
+            data = stream.read(result.itemsize * count)
+            if len(data) != result.itemsize * count:
+                raise InvalidIndexException('Truncated package index.')
+            result.frombytes(data)
+            return result
+        
+        row_indices = {}
+        for path, count in header['sheets']:
+            row_indices[part_name(path)] = read_array('i', count), read_array('Q', count), read_array('Q', count)
+        
+        sst_offsets = {}
+        for path, count in header['sst']:
+            sst_offsets[part_name(path)] = read_array('Q', count)
+        
+        return PackageIndex(fname, header['key'], parts, row_indices, sst_offsets)
+    
+    
+    def __init__(self, fname, key, parts, row_indices, sst_offsets):
+        self.fname = fname
+        self.key = key
+        self.parts = parts
+        self.row_indices = row_indices
+        self.sst_offsets = sst_offsets
+    
+    def find_row(self, path, row_index):
+        # Offset of the first row at or after row_index and the read state to resume from there
+        row_indices, offsets, states = self.row_indices[part_name(path)]
+        i = bisect_left(row_indices, row_index)
+        return (offsets[i], states[i]) if i < len(offsets) else None
+    
+    def save(self, sidecar=None):
+        if sidecar is None:
+            sidecar = PackageIndex.sidecar_path(self.fname)
+        
+        with open(sidecar, 'wb') as f:
+            self.write(f)
+    
+    def write(self, stream):
+        parts = []
+        for part_info in self.parts.values():
+            content_type = part_info.content_type
+            rels = [[r.rid, r.rtype.value, r.target, r.raw_target] for r in part_info.relationships]
+            parts.append([part_info.path, content_type.value if content_type else None, rels])
+        
+        row_indices = self.row_indices
+        sst_offsets = self.sst_offsets
+        header = {
+            'key': self.key,
+            'byteorder': sys.byteorder,
+            'parts': parts,
+            'sheets': [[name.path, len(offsets)] for name, (rows, offsets, states) in row_indices.items()],
+            'sst': [[name.path, len(offsets)] for name, offsets in sst_offsets.items()]
+        }
+        header = json.dumps(header).encode('utf-8')
+        
+        stream.write(PackageIndex.magic)
+        stream.write(struct.pack('<I', len(header)))
+        stream.write(header)
+        for rows, offsets, states in row_indices.values():
+            stream.write(rows.tobytes())
+            stream.write(offsets.tobytes())
+            stream.write(states.tobytes())
+        for offsets in sst_offsets.values():
+            stream.write(offsets.tobytes())
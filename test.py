@@ -41,6 +41,548 @@ if sys.argv[1] == 'r':
             print('-------------------------------------------')
             print()
 
+elif sys.argv[1] == 'rt':
+    import io
+    import time
+    from ooxmlpkg import ZipOfficeOpenXMLPackage
+    from part.worksheet import WorksheetPart
+    from xlsb import read_workbook_sheets
+    
+    # The parse behind 'r', without the printing
+    with ZipOfficeOpenXMLPackage(sys.argv[2]) as pkg:
+        sheets, shared_strings = read_workbook_sheets(pkg)
+        parts = []
+        for sheet_name, sheet_path in sheets:
+            with pkg.open_part(sheet_path) as f:
+                parts.append(f.read())
+    
+    for for_update in (False, True):
+        best = None
+        for i in range(3):
+            start = time.perf_counter()
+            cell_count = 0
+            for data in parts:
+                for row in WorksheetPart.read(io.BytesIO(data), for_update).rows:
+                    row_index = row.header.row_index
+                    for cell in row.cells:
+                        column, value = cell.header.column, cell.value
+                    cell_count += len(row.cells)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{"update" if for_update else "read"}: {cell_count} cells in {best:.3f}s ({cell_count / best / 1000:.0f}k cells/s)')
+
+elif sys.argv[1] == 'rp':
+    from xlsb import iter_workbook
+    
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    for sheet_name, rows in iter_workbook(sys.argv[2], workers):
+        print(sheet_name)
+        print('-------------------------------------------')
+        for row_index, col_first, vals in rows:
+            print('\t'.join(str(v) for v in vals))
+        print('-------------------------------------------')
+        print()
+
+elif sys.argv[1] == 'ps':
+    import time
+    from xlsb import read_sheet
+    
+    baseline = None
+    for workers in (1, 2, 4, 8):
+        start = time.perf_counter()
+        rows = read_sheet(sys.argv[2], sys.argv[3], workers)
+        elapsed = time.perf_counter() - start
+        if baseline is None:
+            baseline = elapsed
+        print(f'{workers} workers: {len(rows)} rows in {elapsed:.3f}s (x{baseline / elapsed:.2f})')
+
+elif sys.argv[1] == 'sl':
+    import time
+    from xlsb import iter_sheet_lists
+    
+    workers = int(sys.argv[2])
+    fnames = sys.argv[3:]
+    
+    start = time.perf_counter()
+    failed = sheet_count = 0
+    for fname, sheets, error in iter_sheet_lists(fnames, workers):
+        if error:
+            failed += 1
+            print(f'{fname}: {error}')
+        else:
+            sheet_count += len(sheets)
+    elapsed = time.perf_counter() - start
+    print(f'{len(fnames)} files, {sheet_count} sheets, {failed} failed in {elapsed:.3f}s ({len(fnames) / elapsed:.0f} files/s)')
+
+elif sys.argv[1] == 'nr':
+    from xlsb import read_named_range
+    
+    sheet = sys.argv[4] if len(sys.argv) > 4 else None
+    for row_index, vals in read_named_range(sys.argv[2], sys.argv[3], sheet):
+        print(row_index, '\t'.join(str(v) for v in vals))
+
+elif sys.argv[1] == 'ac':
+    import time
+    import asyncio
+    import threading
+    import xlsb
+    from xlsbasync import AsyncWorkbook
+    
+    # Cancel a consumer while its batch is still running on the executor; the row iterator must be closed once the batch returns.
+    started = threading.Event()
+    row_values = xlsb.row_values
+    def slow_row_values(row, shared_strings=None):
+        if not started.is_set():
+            started.set()
+            time.sleep(0.2)
+        return row_values(row, shared_strings)
+    xlsb.row_values = slow_row_values
+    
+    async def main():
+        async with await AsyncWorkbook.open(sys.argv[2]) as wb:
+            async def consume():
+                async for row in wb.sheet(wb.sheet_names[0]).rows(10):
+                    pass
+            
+            task = asyncio.create_task(consume())
+            await asyncio.get_running_loop().run_in_executor(None, started.wait)
+            itr = next(iter(wb.open_iterators))
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            assert itr.gi_frame is not None, 'iterator closed while its batch was running'
+            await asyncio.sleep(0.4)
+            assert itr.gi_frame is None, 'iterator not closed after the cancelled batch returned'
+            assert not wb.open_iterators
+        print('ok')
+    
+    asyncio.run(main())
+
+elif sys.argv[1] == 'sp':
+    import io
+    from ooxmlpkg import ZipOfficeOpenXMLPackage
+    from btypes import RelationshipType
+    from part.styles import StylesheetPart, StyleRegistry
+    
+    # Partially read stylesheets resolve what their sections allow and name the missing ones otherwise.
+    with ZipOfficeOpenXMLPackage(sys.argv[2]) as pkg:
+        wb_info = pkg.get_part_info(pkg.get_part_info().get_rel('Type', RelationshipType.WORKBOOK))
+        with pkg.open_part(wb_info.get_rel('Type', RelationshipType.STYLES)) as f:
+            data = f.read()
+    
+    full = StylesheetPart.read(io.BytesIO(data))
+    partial = StylesheetPart.read_formats(io.BytesIO(data))
+    for i in range(len(full.cell_xfs)):
+        assert partial.cell_format_info(i) == full.cell_format_info(i)
+        assert partial.format_str(partial.cell_xfs[i].format_id) == full.format_str(full.cell_xfs[i].format_id)
+    
+    for name, call in (('cell_style', lambda: partial.cell_style(0)), ('StyleRegistry', lambda: StyleRegistry(partial)), ('write', lambda: partial.write(io.BytesIO()))):
+        try:
+            call()
+        except ValueError as e:
+            assert 'fonts, fills, borders' in str(e), e
+        else:
+            raise AssertionError(f'{name} accepted a partially read stylesheet')
+    
+    registry = StyleRegistry(full)
+    registry.add_format('0.000')
+    with io.BytesIO() as f:
+        registry.stylesheet.write(f)
+        data = f.getvalue()
+    fonts_only = StylesheetPart.read(io.BytesIO(data), sections=('fonts',))
+    try:
+        fonts_only.format_str(0)
+    except ValueError as e:
+        assert 'formats' in str(e), e
+    else:
+        raise AssertionError('format_str accepted a stylesheet read without formats')
+    print('ok')
+
+elif sys.argv[1] == 'nt':
+    import io
+    import struct
+    from btypes import BinaryRecordType
+    from bprocessor import RecordDescriptor
+    from part.workbook import WorkbookPart, BundledSheet, HiddenState, DefinedName, ExternSheet, Xti
+    
+    # Defined names and BrtExternSheet written out and read back through WorkbookPart and its NameTable.
+    def area3d(ixti, row_first, row_last, col_first, col_last):
+        return struct.pack('<BHiiHH', 0x3b, ixti, row_first, row_last, col_first | 0xc000, col_last | 0xc000)
+    
+    sheet_refs = [BundledSheet(HiddenState.VISIBLE, i + 1, f'rId{i + 1}', f'Sheet{i + 1}') for i in range(3)]
+    extern_sheet = ExternSheet([Xti(0, 1, 1), Xti(0, 0, 0), Xti(0, 0, 2)])
+    names = [
+        DefinedName('Block', None, area3d(0, 2, 5, 1, 3)),
+        DefinedName('block', 0, area3d(1, 0, 1, 0, 1), comment='Sheet scoped'),
+        DefinedName('Cell', None, struct.pack('<BHiH', 0x3a, 1, 3, 2)),
+        DefinedName('Multi', None, area3d(2, 0, 1, 0, 1)),
+        DefinedName('Const', None, b'\x1e\x05\x00', b'\x01\x02', hidden=True),
+        DefinedName('Macro', None, b'', is_function=True, proc_strings=(None, 'Description', 'Help', None)),
+    ]
+    
+    with io.BytesIO() as f:
+        RecordDescriptor(BinaryRecordType.BrtBeginBook).write(f)
+        RecordDescriptor(BinaryRecordType.BrtBeginBundleShs).write(f)
+        for sheet_ref in sheet_refs:
+            RecordDescriptor(BinaryRecordType.BrtBundleSh, len(sheet_ref)).write(f)
+            sheet_ref.write(f)
+        RecordDescriptor(BinaryRecordType.BrtEndBundleShs).write(f)
+        RecordDescriptor(BinaryRecordType.BrtBeginExternals).write(f)
+        RecordDescriptor(BinaryRecordType.BrtSupSelf).write(f)
+        RecordDescriptor(BinaryRecordType.BrtExternSheet, len(extern_sheet)).write(f)
+        extern_sheet.write(f)
+        RecordDescriptor(BinaryRecordType.BrtEndExternals).write(f)
+        for name in names:
+            start = f.tell()
+            RecordDescriptor(BinaryRecordType.BrtName, len(name)).write(f)
+            data_start = f.tell()
+            name.write(f)
+            assert f.tell() - data_start == len(name), name.name
+        RecordDescriptor(BinaryRecordType.BrtEndBook).write(f)
+        data = f.getvalue()
+    
+    wb = WorkbookPart.read(io.BytesIO(data))
+    assert [(xti.sup_book, xti.tab_first, xti.tab_last) for xti in wb.extern_sheet.xtis] == [(0, 1, 1), (0, 0, 0), (0, 0, 2)]
+    assert len(wb.names) == len(names)
+    for name, read in zip(names, wb.names):
+        assert (read.name, read.sheet_index, read.formula, read.extra, read.comment, read.hidden, read.is_function, read.proc_strings) == \
+                (name.name, name.sheet_index, name.formula, name.extra, name.comment, name.hidden, name.is_function, name.proc_strings), name.name
+    
+    assert wb.names.get('BLOCK') is wb.names.names[0]
+    assert wb.names.get('Block', 0) is wb.names.names[1]
+    assert wb.names.get('block', 2) is wb.names.names[0]
+    sheet_ref, area = wb.resolve_name('block', 'Sheet2')
+    assert sheet_ref.sheet_name == 'Sheet2' and (area.row_first, area.row_last, area.col_first, area.col_last) == (2, 5, 1, 3)
+    sheet_ref, area = wb.resolve_name('cell')
+    assert sheet_ref.sheet_name == 'Sheet1' and (area.row_first, area.col_first) == (3, 2)
+    for bad in ('Multi', 'Const', 'Missing'):
+        try:
+            wb.resolve_name(bad)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'{bad} resolved')
+    
+    wb = WorkbookPart.read(io.BytesIO(data), True)
+    with io.BytesIO() as f:
+        wb.write(f)
+        assert f.getvalue() == data
+    print('ok')
+
+elif sys.argv[1] == 'cs':
+    from btypes import ColorType, ThemeColor
+    from part.styles import StyleRegistry, Font, Fill, GradientStop, Color, PackedColor
+    from part.theme import ThemePart
+    
+    registry = StyleRegistry()
+    stylesheet = registry.stylesheet
+    font = Font.create_default()
+    font.color = Color.from_rgba(0x12, 0x34, 0x56, 0xff)
+    fill = Fill.create_default()
+    fill.gradient_stops = [GradientStop(Color.from_rgba(0xff, 0, 0, 0xff), 0.0), GradientStop(Color(ColorType.THEME, 0, ThemeColor.ACCENT_1, False, 0, 0, 0, 0), 1.0)]
+    style_index = registry.add_style(None, font, fill)
+    
+    # Cached styles hold resolved values, so changing the parts they came from cannot reach them
+    style = stylesheet.cell_style(style_index)
+    hash(style)
+    assert style.text_color == PackedColor(0x123456ff) and style.fill_grad_stops == ((PackedColor(0xff0000ff), 0.0), (None, 1.0)), style
+    stylesheet.fonts[stylesheet.cell_xfs[style_index].font_index].color.set_rgba(0, 0, 0, 0)
+    stylesheet.fills[stylesheet.cell_xfs[style_index].fill_index].gradient_stops[0].color.red = 0
+    assert stylesheet.cell_style(style_index) == style
+    
+    # Theme colours resolve once a theme is set, which drops the styles resolved without it
+    stylesheet.theme = ThemePart(None, tuple(range(0x10, 0x1c)))
+    assert stylesheet.cell_style(style_index).fill_grad_stops[1] == (PackedColor(0x14), 1.0)
+    print('ok')
+
+elif sys.argv[1] == 'tc':
+    import io
+    from btypes import ColorType, PaletteColor, ThemeColor, palette_rgba
+    from part.styles import Color, PackedColor
+    from part.theme import ThemePart, drawingml_ns
+    
+    theme_xml = f'''<a:theme xmlns:a="{drawingml_ns}"><a:themeElements><a:clrScheme name="Office">
+        <a:dk1><a:sysClr val="windowText" lastClr="000000"/></a:dk1><a:lt1><a:sysClr val="window" lastClr="FFFFFF"/></a:lt1>
+        <a:dk2><a:srgbClr val="44546A"/></a:dk2><a:lt2><a:srgbClr val="E7E6E6"/></a:lt2><a:accent1><a:srgbClr val="4472C4"/></a:accent1>
+    </a:clrScheme></a:themeElements></a:theme>'''
+    theme = ThemePart.read(io.BytesIO(theme_xml.encode()))
+    
+    def theme_color(theme_color, valid_rgba=False):
+        return Color(ColorType.THEME, 0, theme_color, valid_rgba, 0x12, 0x34, 0x56, 0xff)
+    
+    # Index 0 is lt1 and index 1 is dk1, whatever the ThemeColor names say
+    assert theme_color(ThemeColor.DK_1).packed(theme) == PackedColor(0xFFFFFFFF)
+    assert theme_color(ThemeColor.LT_1).packed(theme) == PackedColor(0x000000FF)
+    assert theme_color(ThemeColor.DK_2).packed(theme) == PackedColor(0xE7E6E6FF)
+    assert theme_color(ThemeColor.LT_2).packed(theme) == PackedColor(0x44546AFF)
+    assert theme_color(ThemeColor.ACCENT_1).packed(theme) == PackedColor(0x4472C4FF)
+    
+    # Missing slots and a missing theme fall back to the stored RGB value, or None without one
+    assert theme_color(ThemeColor.ACCENT_2, True).packed(theme) == PackedColor(0x123456FF)
+    assert theme_color(ThemeColor.DK_1, True).packed() == PackedColor(0x123456FF)
+    assert theme_color(ThemeColor.DK_1).packed() is None
+    
+    # Palette colours go through palette_rgba; system colours have no entry there
+    for palette_color in PaletteColor:
+        color = Color(ColorType.PALETTE, 0, palette_color, True, 0x12, 0x34, 0x56, 0xff)
+        expected = palette_rgba[palette_color.value]
+        assert palette_color.get_rgba() == expected
+        assert color.packed() == (expected if expected is not None else 0x123456FF), palette_color
+    assert Color(ColorType.PALETTE, 0, PaletteColor.icvForeground, False, 0, 0, 0, 0).packed() is None
+    print('ok')
+
+elif sys.argv[1] == 'ct':
+    import os
+    import tempfile
+    from zipfile import ZipFile
+    from ooxmlpkg import ZipOfficeOpenXMLPackage
+    
+    # Parts without a content type raise ValueError, whether or not the part graph already lists them
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'ct.xlsb')
+        with ZipFile(sys.argv[2]) as src, ZipFile(fname, 'w') as dst:
+            for info in src.infolist():
+                dst.writestr(info, src.read(info))
+            dst.writestr('xl/unknown.zzz', b'')
+        
+        with ZipOfficeOpenXMLPackage(fname) as pkg:
+            pkg.part_graph()
+            try:
+                pkg.get_part_info('/xl/unknown.zzz')
+            except ValueError as e:
+                assert 'No matching override or default' in str(e), e
+            else:
+                raise AssertionError('No ValueError for a part without a content type')
+            assert pkg.get_part_info('/xl/missing.bin') is None
+            assert pkg.get_part_info('/xl/workbook.bin').content_type is not None
+    print('ok')
+
+elif sys.argv[1] == 'pn':
+    import os
+    import tempfile
+    from zipfile import ZipFile
+    from ooxmlpkg import ZipOfficeOpenXMLPackage
+    from btypes import RelationshipType
+    from pkgindex import PackageIndex
+    from xlsb import read_workbook_sheets, iter_sheet_rows
+    
+    # Relationship targets that differ from the stored part names only in case still find their parts
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'pn.xlsb')
+        with ZipFile(sys.argv[2]) as src, ZipFile(fname, 'w') as dst:
+            for info in src.infolist():
+                data = src.read(info)
+                if info.filename == 'xl/_rels/workbook.bin.rels':
+                    data = data.replace(b'worksheets/sheet', b'Worksheets/SHEET')
+                dst.writestr(info, data)
+        
+        with ZipOfficeOpenXMLPackage(sys.argv[2]) as pkg:
+            sheets, shared_strings = read_workbook_sheets(pkg)
+            expected = [list(iter_sheet_rows(pkg, sheet_path, shared_strings)) for sheet_name, sheet_path in sheets]
+        
+        with ZipOfficeOpenXMLPackage(fname) as pkg:
+            wb_info = pkg.get_part_info(pkg.get_part_info().get_rel('Type', RelationshipType.WORKBOOK))
+            sheet_rels = [rel for rel in wb_info.relationships if rel.rtype == RelationshipType.WORKSHEET]
+            assert sheet_rels and all('/Worksheets/SHEET' in rel.target for rel in sheet_rels)
+            for rel in sheet_rels:
+                assert pkg.get_part_info(rel).path == rel.target.replace('/Worksheets/SHEET', '/worksheets/sheet')
+            
+            index = PackageIndex.build(pkg)
+            assert len(index.row_indices) == len(sheet_rels)
+            sheets, shared_strings = read_workbook_sheets(pkg)
+            for (sheet_name, sheet_path), rows in zip(sheets, expected):
+                assert list(iter_sheet_rows(pkg, sheet_path, shared_strings, 1, index)) == [row for row in rows if row[0] >= 1]
+    print('ok')
+
+elif sys.argv[1] == 'sm':
+    import subprocess
+    from multiprocessing import resource_tracker
+    from part.sst import SharedStringTable
+    
+    # Shared strings segment: only the parent tracks and unlinks it; worker attachments leave the resource tracker alone.
+    with SharedStringTable(b'', memoryview(b'').cast('Q')).share() as owner:
+        registered = []
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: registered.append(name)
+        try:
+            with SharedStringTable.attach(owner.handle):
+                pass
+        finally:
+            resource_tracker.register = register
+        assert not registered, registered
+    
+    child = '''
+import sys, multiprocessing
+from multiprocessing import shared_memory
+from xlsb import read_workbook
+multiprocessing.set_start_method(sys.argv[2])
+unlinks = []
+unlink = shared_memory.SharedMemory.unlink
+def counting_unlink(self):
+    unlinks.append(self.name)
+    unlink(self)
+shared_memory.SharedMemory.unlink = counting_unlink
+read_workbook(sys.argv[1], 2)
+assert len(unlinks) == 1, unlinks
+'''
+    for method in ('fork', 'spawn', 'forkserver'):
+        result = subprocess.run([sys.executable, '-c', child, sys.argv[2], method], capture_output=True, text=True)
+        assert result.returncode == 0 and not result.stderr, (method, result.stderr)
+    print('ok')
+
+elif sys.argv[1] == 'dt':
+    from datetime import datetime
+    from numfmt import FormatKind
+    from xldate import SerialDateConverter, numpy
+    
+    if numpy is None:
+        print('skipped: numpy is not installed')
+        sys.exit()
+    
+    def from64(value, unit):
+        return None if numpy.isnat(value) else value.astype(unit).item()
+    
+    serials = [59, 59.5, 60, 60.25, 61, 61.75, 0, 0.5, -0.5, -1, -1.25, -693593, 1, 1462, 45000.999994, 2958465.99999, 1e20, -1e20, float('inf'), float('nan'), 'x', None, True]
+    for uses_1904 in (False, True):
+        converter = SerialDateConverter(uses_1904)
+        numbers = [v if type(v) is float or type(v) is int else None for v in serials]
+        
+        # Out-of-range serials are NaT in the array and None from the scalar converters
+        dates = converter.to_datetime64(serials)
+        assert [from64(v, 'datetime64[ms]') for v in dates] == [converter.to_datetime(v) if v is not None else None for v in numbers], uses_1904
+        assert (converter.convert_array(serials, FormatKind.DATE) == dates).sum() == (~numpy.isnat(dates)).sum()
+        
+        durations = converter.to_timedelta64(serials)
+        assert [from64(v, 'timedelta64[ms]') for v in durations] == [converter.to_timedelta(v) if v is not None else None for v in numbers], uses_1904
+        
+        times = converter.convert_array(numpy.array(numbers, numpy.float64), FormatKind.TIME)
+        expected = [converter.to_time(v) if v is not None else None for v in numbers]
+        assert [(datetime.min + from64(v, 'timedelta64[ms]')).time() if not numpy.isnat(v) else None for v in times] == expected, uses_1904
+    print('ok')
+
+elif sys.argv[1] == 'ix':
+    import io
+    import os
+    import shutil
+    import tempfile
+    from ooxmlpkg import ZipOfficeOpenXMLPackage
+    from btypes import RelationshipType
+    from bprocessor import RecordProcessor, RecordReadState
+    from part.worksheet import WorksheetPart
+    from pkgindex import PackageIndex
+    from xlsb import read_workbook_sheets, iter_sheet_rows
+    
+    # Read stacks survive the round trip through a saved state
+    rprocessor = RecordProcessor(io.BytesIO())
+    for stack in ((), (RecordReadState.FUTURE_RECORD,), (RecordReadState.ALT_CONTENT, RecordReadState.FUTURE_RECORD, RecordReadState.ALT_CONTENT)):
+        rprocessor.read_stack.extend(stack)
+        state = rprocessor.save_state()
+        rprocessor.restore_state(state)
+        assert tuple(rprocessor.read_stack) == stack, (stack, rprocessor.read_stack)
+        rprocessor.read_stack.clear()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, os.path.basename(sys.argv[2]))
+        shutil.copy2(sys.argv[2], fname)
+        
+        # A second relationship to the first sheet must not scan it again
+        with ZipOfficeOpenXMLPackage(fname) as pkg:
+            sheets, shared_strings = read_workbook_sheets(pkg)
+            with pkg.open_part_relationships('/xl/workbook.bin', 'w') as rels:
+                rels.add_rel(RelationshipType.WORKSHEET, sheets[0][1])
+        
+        scanned = []
+        scan_rows = WorksheetPart.scan_rows
+        WorksheetPart.scan_rows = staticmethod(lambda stream: scanned.append(1) or scan_rows(stream))
+        with ZipOfficeOpenXMLPackage(fname) as pkg:
+            index = PackageIndex.build(pkg)
+        WorksheetPart.scan_rows = staticmethod(scan_rows)
+        assert len(scanned) == len(sheets), (len(scanned), len(sheets))
+        
+        index.save()
+        loaded = PackageIndex.load(fname)
+        assert loaded is not None and all(tuple(map(list, loaded.row_indices[p])) == tuple(map(list, index.row_indices[p])) for p in index.row_indices)
+        
+        with ZipOfficeOpenXMLPackage(fname) as pkg:
+            sheets, shared_strings = read_workbook_sheets(pkg)
+            for sheet_name, sheet_path in sheets:
+                rows = list(iter_sheet_rows(pkg, sheet_path, shared_strings))
+                for row_first in (0, 1, len(rows) // 2, rows[-1][0], rows[-1][0] + 1):
+                    expected = [row for row in rows if row[0] >= row_first]
+                    assert list(iter_sheet_rows(pkg, sheet_path, shared_strings, row_first)) == expected
+                    assert list(iter_sheet_rows(pkg, sheet_path, shared_strings, row_first, loaded)) == expected
+    print('ok')
+
+elif sys.argv[1] == 'cb':
+    import io
+    import os
+    import time
+    from zipfile import ZIP_STORED, ZIP_DEFLATED
+    from ooxmlpkg import ZipOfficeOpenXMLPackage, CompressionPolicy
+    from btypes import ContentType
+    from part.worksheet import WorksheetPart, Row, RowHeader, ColumnSpan, CellHeader, RkCell, RealCell, SheetDimension
+    
+    row_count = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+    col_count = 10
+    
+    rows = []
+    for r in range(row_count):
+        cells = [RkCell(CellHeader(c, 0, False), r + c) if c % 2 else RealCell(CellHeader(c, 0, False), r / (c + 1)) for c in range(col_count)]
+        rows.append(Row(RowHeader(r, 0, 300, False, False, 0, False, False, False, False, False, [ColumnSpan(0, col_count - 1)]), cells))
+    ws = WorksheetPart(SheetDimension(0, row_count - 1, 0, col_count - 1), [], rows)
+    with io.BytesIO() as f:
+        ws.write(f)
+        sheet_data = f.getvalue()
+    
+    policies = [
+        ('store', CompressionPolicy.store()),
+        ('deflate 1', CompressionPolicy(ZIP_DEFLATED, 1)),
+        ('deflate 6', CompressionPolicy(ZIP_DEFLATED, 6)),
+        ('deflate 9', CompressionPolicy(ZIP_DEFLATED, 9)),
+        ('store sheets', CompressionPolicy(rules={ContentType.WORKSHEET: (ZIP_STORED,)}))
+    ]
+    print(f'{row_count * col_count} cells, {len(sheet_data) / 1024 / 1024:.1f}MB sheet part')
+    for name, policy in policies:
+        start = time.perf_counter()
+        with ZipOfficeOpenXMLPackage(sys.argv[2], True, True, policy) as pkg:
+            with pkg.open_part('/xl/worksheets/sheet1.bin', 'w', ContentType.WORKSHEET) as f:
+                f.write(sheet_data)
+        elapsed = time.perf_counter() - start
+        print(f'{name}: {elapsed:.3f}s ({len(sheet_data) / 1024 / 1024 / elapsed:.1f}MB/s), {os.path.getsize(sys.argv[2]) / 1024 / 1024:.2f}MB')
+    os.remove(sys.argv[2])
+
+elif sys.argv[1] == 'sb':
+    import io
+    import time
+    from btypes import BorderType
+    from part.styles import StylesheetPart, StyleRegistry, Font, Fill, Border, BorderDefinition, Color
+    
+    xf_count = int(sys.argv[2]) if len(sys.argv) > 2 else 60000
+    
+    registry = StyleRegistry()
+    for i in range(xf_count):
+        font = Font.create_default()
+        font.height = 100 + i % 3000
+        fill = Fill.create_default()
+        fill.gradient_angle = float(i % 2000)
+        border = Border.create_default()
+        border.top = BorderDefinition(BorderType.THIN, Color.from_rgba(i % 256, 0, 0, 255))
+        registry.add_style('0.' + '0' * (i % 20) if i % 20 else None, font, fill, border)
+    
+    with io.BytesIO() as f:
+        registry.stylesheet.write(f)
+        data = f.getvalue()
+    
+    stylesheet = registry.stylesheet
+    print(f'{len(stylesheet.cell_xfs)} XFs, {len(stylesheet.fonts)} fonts, {len(stylesheet.fills)} fills, {len(stylesheet.borders)} borders, {len(data) / 1024:.0f}KB')
+    for name, read in (('full', StylesheetPart.read), ('formats + cell XFs', StylesheetPart.read_formats)):
+        start = time.perf_counter()
+        for i in range(5):
+            read(io.BytesIO(data))
+        print(f'{name}: {(time.perf_counter() - start) / 5 * 1000:.1f}ms')
+
 elif sys.argv[1] == 'i':
     from ooxmlpkg import ZipOfficeOpenXMLPackage
     from bprocessor import RecordDescriptor
@@ -71,7 +613,8 @@ elif sys.argv[1] == 'w':
     from ooxmlpkg import ZipOfficeOpenXMLPackage
     from btypes import RelationshipType, ContentType
     
-    with ZipOfficeOpenXMLPackage(sys.argv[2], True) as pkg:
+    direct = len(sys.argv) > 3 and sys.argv[3] == 'd'
+    with ZipOfficeOpenXMLPackage(sys.argv[2], True, direct) as pkg:
         ws = WorksheetPart.create_default()
         stylesheet = StylesheetPart.create_default()
         
@@ -120,6 +663,200 @@ elif sys.argv[1] == 'c':
             f.write(f'<tr><td style="{st}">{c1}</td><td style="{st}">{c2}</td></tr>')
         f.write('</tbody></table></body></html>')
 
+elif sys.argv[1] == 'z6':
+    import os
+    import struct
+    import tempfile
+    from zipfile import ZipFile
+    from ooxmlpkg import ZipOfficeOpenXMLPackage, local_file_header, zip64_extra_id
+    from btypes import ContentType
+    
+    def has_zip64_extra(zf, info):
+        zf.fp.seek(info.header_offset)
+        fheader = local_file_header.unpack(zf.fp.read(local_file_header.size))
+        zf.fp.seek(fheader[10], os.SEEK_CUR)
+        extra = zf.fp.read(fheader[11])
+        i = 0
+        while i + 4 <= len(extra):
+            header_id, size = struct.unpack_from('<HH', extra, i)
+            if header_id == zip64_extra_id:
+                return True
+            i += 4 + size
+        return False
+    
+    # ZIP64 fields are reserved for hints over 2 GiB and binary parts of unknown size only
+    parts = (('/xl/worksheets/sheet1.bin', ContentType.WORKSHEET, None, True), ('/xl/worksheets/sheet2.bin', ContentType.WORKSHEET, 5000, False),
+            ('/xl/worksheets/sheet3.bin', ContentType.WORKSHEET, 3 * 1024 ** 3, True), ('/xl/theme/theme1.xml', ContentType.THEME, None, False))
+    with tempfile.TemporaryDirectory() as tmp:
+        fname = os.path.join(tmp, 'z64.xlsb')
+        with ZipOfficeOpenXMLPackage(fname, True, True) as pkg:
+            for path, content_type, size_hint, zip64 in parts:
+                with pkg.open_part(path, 'w', content_type, size_hint=size_hint) as f:
+                    f.write(bytes(5000))
+        
+        with ZipFile(fname) as zf:
+            assert zf.testzip() is None
+            for path, content_type, size_hint, zip64 in parts:
+                assert has_zip64_extra(zf, zf.getinfo(path[1:])) == zip64, path
+    print('ok')
+
+elif sys.argv[1] == 'zr':
+    import io
+    import os
+    import tempfile
+    import zipfile
+    import ooxmlpkg
+    from zipfile import ZipFile, ZIP_DEFLATED, ZIP_STORED
+    
+    class Unseekable(io.RawIOBase):
+        def __init__(self, f):
+            self.f = f
+        
+        def writable(self):
+            return True
+        
+        def write(self, data):
+            return self.f.write(data)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Sources cover stored, deflated, data descriptor and ZIP64 extra members
+        src_names = [os.path.join(tmp, 'plain.zip'), os.path.join(tmp, 'streamed.zip'), os.path.join(tmp, 'zip64.zip')]
+        with ZipFile(src_names[0], 'w') as zf:
+            zf.writestr('stored.bin', os.urandom(5000), ZIP_STORED)
+            zf.writestr('deflated.bin', bytes(100000), ZIP_DEFLATED)
+        with open(src_names[1], 'wb') as f, ZipFile(Unseekable(f), 'w', ZIP_DEFLATED) as zf:
+            zf.writestr('described.bin', os.urandom(3000) + bytes(3000))
+        with ZipFile(src_names[2], 'w', ZIP_DEFLATED) as zf:
+            with zf.open('forced.bin', 'w', force_zip64=True) as f:
+                f.write(bytes(70000))
+        
+        internals = ooxmlpkg.zip_internals
+        for raw in (True, False):
+            ooxmlpkg.zip_internals = internals if raw else internals + ('_no_such_attr',)
+            fname = os.path.join(tmp, f'copy-{raw}.zip')
+            with ZipFile(fname, 'w') as dest:
+                assert ooxmlpkg.supports_raw_members(dest) == raw
+                for src_name in src_names:
+                    with ZipFile(src_name) as src:
+                        for info in src.infolist():
+                            ooxmlpkg.copy_zip_member(src, dest, info)
+            
+            with ZipFile(fname) as dest:
+                assert dest.testzip() is None, raw
+                for src_name in src_names:
+                    with ZipFile(src_name) as src:
+                        for info in src.infolist():
+                            copied = dest.getinfo(info.filename)
+                            assert dest.read(copied) == src.read(info), (raw, info.filename)
+                            assert (copied.CRC, copied.compress_type) == (info.CRC, info.compress_type)
+                            if raw:
+                                assert copied.compress_size == info.compress_size and not copied.flag_bits & 0x08, info.filename
+        ooxmlpkg.zip_internals = internals
+    print(f'ok ({sys.version.split()[0]})')
+
+elif sys.argv[1] == 'pf':
+    from zipfile import ZipFile
+    from ooxmlpkg import PartPrefetcher
+    
+    with ZipFile(sys.argv[2]) as zf:
+        infos = sorted((info for info in zf.infolist() if info.file_size), key=lambda info: -info.file_size)[:3]
+    paths = [info.filename for info in infos]
+    
+    # The budget fits one part at a time, so each part only loads once the one before it is released
+    prefetcher = PartPrefetcher(sys.argv[2], paths, 2, infos[0].file_size)
+    entries = dict(prefetcher.entries)
+    entries[paths[0]].future.result(5)
+    assert prefetcher.in_use == infos[0].file_size
+    prefetcher.cancel(paths[0])
+    entries[paths[1]].future.result(5)
+    assert prefetcher.in_use == infos[1].file_size, prefetcher.in_use
+    with ZipFile(sys.argv[2]) as zf:
+        assert prefetcher.take(paths[1]) == zf.read(paths[1])
+    entries[paths[2]].future.result(5)
+    assert prefetcher.in_use == infos[2].file_size, prefetcher.in_use
+    
+    # Parts never taken give their budget back on close
+    prefetcher.close()
+    assert prefetcher.in_use == 0 and not prefetcher.entries
+    
+    # Closing before a part gets its budget must not release what it never held
+    prefetcher = PartPrefetcher(sys.argv[2], paths, 2, infos[0].file_size)
+    prefetcher.entries[paths[0]].future.result(5)
+    prefetcher.close()
+    assert prefetcher.in_use == 0, prefetcher.in_use
+    print('ok')
+
+elif sys.argv[1] == 'rl':
+    import io
+    import time
+    import xml.etree.ElementTree as ET
+    from ooxmlpkg import PartRelationshipsPart
+    from btypes import RelationshipType
+    
+    def make_rels(count):
+        rels = ''.join(f'<Relationship Id="rId{i}" Type="{RelationshipType.WORKSHEET.value}" Target="worksheets/sheet{i}.bin"/>' for i in range(1, count + 1))
+        xml = f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{rels}</Relationships>'
+        return PartRelationshipsPart('/xl', ET.parse(io.BytesIO(xml.encode())))
+    
+    # Removal order and lookups after removal
+    rels = make_rels(5)
+    rels.remove_rel('Type', RelationshipType.WORKSHEET)
+    rels.remove_rel('Target', 'worksheets/sheet4.bin')
+    assert rels.get_rel('Id', 'rId1') is None and rels.get_rel('Type', RelationshipType.WORKSHEET).rid == 'rId2'
+    assert rels.add_rel(RelationshipType.WORKSHEET, 'worksheets/new.bin') == 'rId1'
+    assert [rel.rid for rel in rels] == ['rId2', 'rId3', 'rId5', 'rId1'] and len(rels) == 4
+    f = rels.file_handle = io.BytesIO()
+    f.close = lambda: None
+    rels.close()
+    assert [rel.rid for rel in PartRelationshipsPart('/xl', ET.parse(io.BytesIO(f.getvalue())))] == ['rId2', 'rId3', 'rId5', 'rId1']
+    
+    # Removing every relationship of one Type costs the same per removal at any size
+    for count in (5000, 40000):
+        rels = make_rels(count)
+        start = time.perf_counter()
+        for i in range(count, 0, -1):
+            rels.remove_rel('Id', f'rId{i}')
+        elapsed = time.perf_counter() - start
+        assert len(rels) == 0 and not list(rels)
+        print(f'{count} removals: {elapsed:.3f}s ({elapsed / count * 1e6:.1f}us each)')
+    print('ok')
+
+elif sys.argv[1] == 'zm':
+    import os
+    import tempfile
+    import ooxmlpkg
+    from zipfile import ZipFile, ZipInfo, ZIP_DEFLATED, ZIP_STORED
+    
+    max_bytes = 256 * 1024
+    sizes = (1000, 200 * 1024, 3 * 1024 * 1024 + 17, 0, 100 * 1024)
+    with tempfile.TemporaryDirectory() as tmp:
+        members = []
+        for i, size in enumerate(sizes):
+            src = os.path.join(tmp, f'{i}.bin')
+            with open(src, 'wb') as f:
+                f.write(os.urandom(size // 2) + bytes(size - size // 2))
+            zinfo = ZipInfo(f'{i}.bin', (2020, 1, 1, 0, 0, 0))
+            zinfo.compress_type = ZIP_DEFLATED if i % 2 else ZIP_STORED
+            members.append((zinfo, src))
+        
+        # Members over the budget take the serial path instead of being compressed into memory
+        compressed = []
+        compress_member = ooxmlpkg.compress_member
+        ooxmlpkg.compress_member = lambda zinfo, src: compressed.append(zinfo.filename) or compress_member(zinfo, src, 64 * 1024)
+        fname = os.path.join(tmp, 'out.zip')
+        with ZipFile(fname, 'w') as zf:
+            ooxmlpkg.zip_members(zf, members, 2, max_bytes)
+        ooxmlpkg.compress_member = compress_member
+        assert sorted(compressed) == sorted(zinfo.filename for zinfo, src in members if os.path.getsize(src) <= max_bytes), compressed
+        
+        with ZipFile(fname) as zf:
+            assert zf.testzip() is None
+            assert [info.filename for info in zf.infolist()] == [zinfo.filename for zinfo, src in members]
+            for zinfo, src in members:
+                with open(src, 'rb') as f:
+                    assert zf.read(zinfo.filename) == f.read(), zinfo.filename
+    print('ok')
+
 elif sys.argv[1] == 'z':
     from ooxmlpkg import rec_zip
     
@@ -0,0 +1,144 @@
+
+from datetime import datetime, timedelta, time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from numfmt import FormatKind
+
+
+ms_per_day = 86400000
+
+# The 1900 date system counts a 29 February 1900 that never existed (serial 60); serials before it are a day early.
+leap_bug_start = 60 * ms_per_day
+leap_bug_end = 61 * ms_per_day
+
+# Array results past what datetime/timedelta can hold are NaT, matching the None from the scalar converters
+max_timedelta_ms = timedelta.max // timedelta(milliseconds=1)
+
+
+class SerialDateConverter:
+    @staticmethod
+    def for_workbook(workbook_part):
+        props = workbook_part.props
+        return SerialDateConverter(bool(props and props.uses_legacy_date_format))
+    
+    def __init__(self, uses_1904=False):
+        self.uses_1904 = uses_1904
+        self.epoch = datetime(1904, 1, 1) if uses_1904 else datetime(1899, 12, 30)
+        self.epoch64 = numpy.datetime64(self.epoch, 'ms') if numpy is not None else None
+        self.min_ms = -((self.epoch - datetime.min) // timedelta(milliseconds=1))
+        self.max_ms = (datetime.max - self.epoch) // timedelta(milliseconds=1)
+    
+    def to_ms(self, serial):
+        ms = round(serial * ms_per_day)
+        if not self.uses_1904 and ms < leap_bug_end:
+            if ms >= leap_bug_start:
+                return None
+            ms += ms_per_day
+        return ms
+    
+    def to_datetime(self, serial):
+        try:
+            ms = self.to_ms(serial)
+            return self.epoch + timedelta(milliseconds=ms) if ms is not None else None
+        except (OverflowError, ValueError):
+            return None
+    
+    def to_time(self, serial):
+        try:
+            ms = round(serial * ms_per_day) % ms_per_day
+        except (OverflowError, ValueError):
+            return None
+        seconds, ms = divmod(ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return time(hours, minutes, seconds, ms * 1000)
+    
+    def to_timedelta(self, serial):
+        try:
+            return timedelta(milliseconds=round(serial * ms_per_day))
+        except (OverflowError, ValueError):
+            return None
+    
+    def convert(self, values, kind):
+        if kind == FormatKind.DATE or kind == FormatKind.DATETIME:
+            return self.convert_datetimes(values)
+        elif kind == FormatKind.TIME:
+            convert = self.to_time
+        elif kind == FormatKind.DURATION:
+            convert = self.to_timedelta
+        else:
+            return list(values)
+        
+        # Empty, string, boolean and error cells pass through untouched
+        return [convert(v) if type(v) is float or type(v) is int else v for v in values]
+    
+    def convert_datetimes(self, values):
+        # to_datetime() inlined; datetime construction dominates, so avoid a call per cell on top of it
+        epoch = self.epoch
+        delta = timedelta
+        fix_leap_bug = not self.uses_1904
+        
+        result = []
+        append = result.append
+        for v in values:
+            if type(v) is float or type(v) is int:
+                try:
+                    ms = round(v * ms_per_day)
+                    if fix_leap_bug and ms < leap_bug_end:
+                        if ms >= leap_bug_start:
+                            append(None)
+                            continue
+                        ms += ms_per_day
+                    v = epoch + delta(0, 0, 0, ms)
+                except (OverflowError, ValueError):
+                    v = None
+            append(v)
+        return result
+    
+    def to_serial_array(self, values):
+        return numpy.fromiter((v if type(v) is float or type(v) is int else numpy.nan for v in values), numpy.float64)
+    
+    def to_datetime64(self, values):
+        if numpy is None:
+            raise ValueError('NumPy is required for datetime64 conversion.')
+        
+        serials = values if isinstance(values, numpy.ndarray) else self.to_serial_array(values)
+        ms = numpy.rint(serials * ms_per_day)
+        invalid = numpy.isnan(ms)
+        if not self.uses_1904:
+            invalid |= (ms >= leap_bug_start) & (ms < leap_bug_end)
+            ms = numpy.where(ms < leap_bug_start, ms + ms_per_day, ms)
+        invalid |= (ms < self.min_ms) | (ms > self.max_ms)
+        
+        result = self.epoch64 + numpy.where(invalid, 0, ms).astype(numpy.int64).astype('timedelta64[ms]')
+        result[invalid] = numpy.datetime64('NaT')
+        return result
+    
+    def to_timedelta64(self, values, time_of_day=False):
+        if numpy is None:
+            raise ValueError('NumPy is required for timedelta64 conversion.')
+        
+        serials = values if isinstance(values, numpy.ndarray) else self.to_serial_array(values)
+        ms = numpy.rint(serials * ms_per_day)
+        invalid = ~numpy.isfinite(ms)
+        if time_of_day:
+            ms = numpy.mod(numpy.where(invalid, 0, ms), ms_per_day)
+        else:
+            invalid |= numpy.abs(numpy.where(invalid, 0, ms)) > max_timedelta_ms
+        
+        result = numpy.where(invalid, 0, ms).astype(numpy.int64).astype('timedelta64[ms]')
+        result[invalid] = numpy.timedelta64('NaT')
+        return result
+    
+    def convert_array(self, values, kind):
+        if kind == FormatKind.DATE or kind == FormatKind.DATETIME:
+            return self.to_datetime64(values)
+        elif kind == FormatKind.TIME:
+            return self.to_timedelta64(values, True)
+        elif kind == FormatKind.DURATION:
+            return self.to_timedelta64(values)
+        return values
@@ -1,12 +1,23 @@
 
+import io
+import os
+import copy
+import struct
 from enum import Enum
+from zipfile import ZipFile
+from operator import attrgetter
+from multiprocessing.util import Finalize
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-from btypes import HorizontalAlignmentType, VerticalAlignmentType, ReadingOrderType, XFProperty, ColorType, \
-        PaletteColor, ThemeColor, SubscriptType, UnderlineType, FontFamilyType, CharacterSetType, FontSchemeType, FillType, GradientType, \
-        BorderType
+from btypes import RelationshipType, BinaryRecordType
 
-from part.styles import Color, num_format_lu_all_langs
-from part.worksheet import SharedStringCell
+from bprocessor import RecordProcessor
+from ooxmlpkg import ZipOfficeOpenXMLPackage, PartRelationshipsPart, norm_path
+from part.styles import Font, Fill, Border, CellXF, GradientStop, num_format_lu_all_langs
+from part.sst import SharedStringTable
+from part.theme import ThemePart
+from part.workbook import WorkbookPart
+from part.worksheet import SharedStringCell, WorksheetPart
 
 
 class FontWeight(Enum):
@@ -28,63 +39,113 @@ class FontWeight(Enum):
             current = subsequent
         return FontWeight.MAX
 
+default_font = Font.create_default()
+default_fill = Fill.create_default()
+default_border = Border.create_default()
+default_xf = CellXF.create_default_inline()
+
+def styled(name, part_name, attr, default_part, mutable=False):
+    # Reads through to the part (or its default) until the first assignment detaches the Styleable.
+    get_part = attrgetter(part_name)
+    get_attr = attrgetter(attr)
+    def fget(self):
+        values = self._values
+        if values is not None:
+            return values[name]
+        part = get_part(self)
+        return get_attr(part if part is not None else default_part)
+    def fget_mutable(self):
+        return self.detach()[name]
+    def fset(self, value):
+        self.detach()[name] = value
+    return property(fget_mutable if mutable else fget, fset)
+
+# Values that can be changed in place; reading one detaches the Styleable so it only ever changes its own copy.
+mutable_style_attrs = frozenset(('text_color', 'fill_fg_color', 'fill_bg_color', 'fill_grad_stops', 'border_top_color', 'border_bottom_color',
+        'border_right_color', 'border_left_color', 'border_diag_color'))
+
+
 class Styleable:
+    __slots__ = ('format_part', 'font_part', 'border_part', 'fill_part', 'xf_part', '_values')
+    
+    style_attrs = ('number_format', 'font_height', 'italic', 'strikeout', 'font_weight_i', 'subscript_type', 'underline_type', 'font_family', 'charset',
+            'text_color', 'font_scheme', 'font_name', 'fill_type', 'fill_fg_color', 'fill_bg_color', 'fill_grad_type', 'fill_grad_angle', 'fill_grad_left',
+            'fill_grad_right', 'fill_grad_top', 'fill_grad_bottom', 'fill_grad_stops', 'border_top_type', 'border_top_color', 'border_bottom_type',
+            'border_bottom_color', 'border_right_type', 'border_right_color', 'border_left_type', 'border_left_color', 'border_diag_type',
+            'border_diag_color', 'has_diag_down_border', 'has_diag_up_border', 'text_trot', 'indent', 'horizontal_alignment', 'vertical_alignment',
+            'shrink_to_fit', 'reading_order_type')
+    plain_attrs = tuple(name for name in style_attrs if name not in mutable_style_attrs)
+    
     def __init__(self, format_part=None, font_part=None, border_part=None, fill_part=None, xf_part=None):
-        self._initialized = self._dirty = False
-        
-        if format_part:
-            self.number_format = format_part.format_str
-        elif xf_part and xf_part.format_id in num_format_lu_all_langs:
-            self.number_format = num_format_lu_all_langs[xf_part.format_id]
-        else:
-            self.number_format = ''
-        
-        self.font_height = font_part.height if font_part else 220
-        self.italic = font_part.italic if font_part else False
-        self.strikeout = font_part.strikeout if font_part else False
-        self.font_weight_i = font_part.weight if font_part else 400
-        self.subscript_type = font_part.subscript_type if font_part else SubscriptType.NONE
-        self.underline_type = font_part.underline_type if font_part else UnderlineType.NONE
-        self.font_family = font_part.family if font_part else FontFamilyType.SWISS
-        self.charset = font_part.char_set_type if font_part else CharacterSetType.ANSI_CHARSET
-        self.text_color = font_part.color if font_part else Color(ColorType.THEME, 0, ThemeColor.LT_1, True, 0, 0, 0, 255)
-        self.font_scheme = font_part.font_scheme if font_part else FontSchemeType.MINOR
-        self.font_name = font_part.name if font_part else 'Calibri'
-        self.fill_type = fill_part.fill_type if fill_part else FillType.NONE
-        self.fill_fg_color = fill_part.foreground_color if fill_part else Color(ColorType.INDEX, 0, PaletteColor.icvForeground, True, 0, 0, 0, 255)
-        self.fill_bg_color = fill_part.background_color if fill_part else Color(ColorType.INDEX, 0, PaletteColor.icvBackground, True, 255, 255, 255, 255)
-        self.fill_grad_type = fill_part.gradient_type if fill_part else GradientType.LINEAR
-        self.fill_grad_angle = fill_part.gradient_angle if fill_part else 0.0
-        self.fill_grad_left = fill_part.gradient_fill_left if fill_part else 0.0
-        self.fill_grad_right = fill_part.gradient_fill_right if fill_part else 0.0
-        self.fill_grad_top = fill_part.gradient_fill_top if fill_part else 0.0
-        self.fill_grad_bottom = fill_part.gradient_fill_bottom if fill_part else 0.0
-        self.fill_grad_stops = list(fill_part.gradient_stops) if fill_part else []
-        
-        for prefix, pname in (('border_top_', 'top'), ('border_bottom_', 'bottom'), ('border_right_', 'right'), ('border_left_', 'left'), ('border_diag_', 'diagonal')):
-            setattr(self, f'{prefix}_type', getattr(border_part, pname).border_type if border_part else BorderType.NONE)
-            setattr(self, f'{prefix}_color', getattr(border_part, pname).color if border_part else Color(ColorType.AUTO, 0, 0, True, 0, 0, 0, 0))
-
-        self.has_diag_down_border = border_part.has_diagonal_down if border_part else False
-        self.has_diag_up_border = border_part.has_diagonal_up if border_part else False
-        self.text_trot = xf_part.text_trot if xf_part else 0
-        self.indent = xf_part.indent if xf_part else 0
-        self.horizontal_alignment = xf_part.horizontal_alignment if xf_part else HorizontalAlignmentType.GENERAL
-        self.vertical_alignment = xf_part.vertical_alignment if xf_part else VerticalAlignmentType.BOTTOM
-        self.shrink_to_fit = xf_part.shrink_to_fit if xf_part else False
-        self.reading_order_type = xf_part.reading_order_type if xf_part else ReadingOrderType.CONTEXT_DEPENDENT
-        
         self.format_part = format_part
         self.font_part = font_part
         self.border_part = border_part
         self.fill_part = fill_part
         self.xf_part = xf_part
+        self._values = None
+    
+    @property
+    def number_format(self):
+        values = self._values
+        if values is not None:
+            return values['number_format']
         
-        self._initialized = True
+        format_part = self.format_part
+        if format_part:
+            return format_part.format_str
+        xf_part = self.xf_part
+        return num_format_lu_all_langs.get(xf_part.format_id, '') if xf_part else ''
+    
+    @number_format.setter
+    def number_format(self, value):
+        self.detach()['number_format'] = value
+    
+    font_height = styled('font_height', 'font_part', 'height', default_font)
+    italic = styled('italic', 'font_part', 'italic', default_font)
+    strikeout = styled('strikeout', 'font_part', 'strikeout', default_font)
+    font_weight_i = styled('font_weight_i', 'font_part', 'weight', default_font)
+    subscript_type = styled('subscript_type', 'font_part', 'subscript_type', default_font)
+    underline_type = styled('underline_type', 'font_part', 'underline_type', default_font)
+    font_family = styled('font_family', 'font_part', 'family', default_font)
+    charset = styled('charset', 'font_part', 'char_set_type', default_font)
+    text_color = styled('text_color', 'font_part', 'color', default_font, True)
+    font_scheme = styled('font_scheme', 'font_part', 'font_scheme', default_font)
+    font_name = styled('font_name', 'font_part', 'name', default_font)
+    
+    fill_type = styled('fill_type', 'fill_part', 'fill_type', default_fill)
+    fill_fg_color = styled('fill_fg_color', 'fill_part', 'foreground_color', default_fill, True)
+    fill_bg_color = styled('fill_bg_color', 'fill_part', 'background_color', default_fill, True)
+    fill_grad_type = styled('fill_grad_type', 'fill_part', 'gradient_type', default_fill)
+    fill_grad_angle = styled('fill_grad_angle', 'fill_part', 'gradient_angle', default_fill)
+    fill_grad_left = styled('fill_grad_left', 'fill_part', 'gradient_fill_left', default_fill)
+    fill_grad_right = styled('fill_grad_right', 'fill_part', 'gradient_fill_right', default_fill)
+    fill_grad_top = styled('fill_grad_top', 'fill_part', 'gradient_fill_top', default_fill)
+    fill_grad_bottom = styled('fill_grad_bottom', 'fill_part', 'gradient_fill_bottom', default_fill)
+    fill_grad_stops = styled('fill_grad_stops', 'fill_part', 'gradient_stops', default_fill, True)
+    
+    border_top_type = styled('border_top_type', 'border_part', 'top.border_type', default_border)
+    border_top_color = styled('border_top_color', 'border_part', 'top.color', default_border, True)
+    border_bottom_type = styled('border_bottom_type', 'border_part', 'bottom.border_type', default_border)
+    border_bottom_color = styled('border_bottom_color', 'border_part', 'bottom.color', default_border, True)
+    border_right_type = styled('border_right_type', 'border_part', 'right.border_type', default_border)
+    border_right_color = styled('border_right_color', 'border_part', 'right.color', default_border, True)
+    border_left_type = styled('border_left_type', 'border_part', 'left.border_type', default_border)
+    border_left_color = styled('border_left_color', 'border_part', 'left.color', default_border, True)
+    border_diag_type = styled('border_diag_type', 'border_part', 'diagonal.border_type', default_border)
+    border_diag_color = styled('border_diag_color', 'border_part', 'diagonal.color', default_border, True)
+    has_diag_down_border = styled('has_diag_down_border', 'border_part', 'has_diagonal_down', default_border)
+    has_diag_up_border = styled('has_diag_up_border', 'border_part', 'has_diagonal_up', default_border)
+    
+    text_trot = styled('text_trot', 'xf_part', 'text_trot', default_xf)
+    indent = styled('indent', 'xf_part', 'indent', default_xf)
+    horizontal_alignment = styled('horizontal_alignment', 'xf_part', 'horizontal_align_type', default_xf)
+    vertical_alignment = styled('vertical_alignment', 'xf_part', 'vertical_align_type', default_xf)
+    shrink_to_fit = styled('shrink_to_fit', 'xf_part', 'shrink_to_fit', default_xf)
+    reading_order_type = styled('reading_order_type', 'xf_part', 'reading_order_type', default_xf)
     
     @property
     def font_weight(self):
-        return FontWeight.resolve(self.font_weight_i)
+        return FontWeight.resolve_i(self.font_weight_i)
     
     @font_weight.setter
     def font_weight(self, value):
@@ -94,21 +155,32 @@ class Styleable:
     def part_list(self):
         return ['format_part', 'font_part', 'border_part', 'fill_part', 'xf_part']
     
-    def __setattr__(self, name, value):
-        object.__setattr__(self, name, value)
-        
-        if name in ('_initialized', '_dirty'):
-            return
-        
-        if self._initialized and not self._dirty:
-            part_list = self.part_list
-            if name in part_list:
-                return
-            
-            for pname in part_list:
-                object.__setattr__(self, pname, None)
+    @property
+    def dirty(self):
+        return self._values is not None
+    
+    def detach(self):
+        values = self._values
+        if values is None:
+            # Copy on write: snapshot the shared parts' values (defaults included) and drop the parts.
+            values = dict((name, getattr(self, name)) for name in self.plain_attrs)
+            font = self.font_part or default_font
+            fill = self.fill_part or default_fill
+            border = self.border_part or default_border
+            values['text_color'] = copy.copy(font.color)
+            values['fill_fg_color'] = copy.copy(fill.foreground_color)
+            values['fill_bg_color'] = copy.copy(fill.background_color)
+            values['fill_grad_stops'] = [GradientStop(copy.copy(stop.color), stop.position) for stop in fill.gradient_stops]
+            values['border_top_color'] = copy.copy(border.top.color)
+            values['border_bottom_color'] = copy.copy(border.bottom.color)
+            values['border_right_color'] = copy.copy(border.right.color)
+            values['border_left_color'] = copy.copy(border.left.color)
+            values['border_diag_color'] = copy.copy(border.diagonal.color)
             
-            object.__setattr__(self, '_dirty', True)
+            for pname in self.part_list:
+                setattr(self, pname, None)
+            self._values = values
+        return values
 
 
 class Column(Styleable):
@@ -116,6 +188,8 @@ class Column(Styleable):
         pass
 
 class Cell(Styleable):
+    __slots__ = ('row_index', 'column_index', 'value', 'cell_part', 'rich_str_part')
+    
     def __init__(self, row_header_part=None, cell_part=None, shared_strings_part=None, format_part=None, font_part=None, border_part=None, fill_part=None, xf_part=None):
         self.row_index = None
         self.column_index = None
@@ -130,7 +204,7 @@ class Cell(Styleable):
             rich_str_part = self.rich_str_part = shared_strings_part[cell_part.str_index]
             self.value = rich_str_part.val
         elif cell_part:
-            self.value = cell.value
+            self.value = cell_part.value
         
         if cell_part:
             if not row_header_part:
@@ -145,3 +219,252 @@ class Cell(Styleable):
     def part_list(self):
         return super().part_list + ['cell_part', 'rich_str_part']
 
+
+def row_values(row, shared_strings=None):
+    cells = row.cells
+    if not cells:
+        return row.header.row_index, 0, []
+    
+    col_first = cells[0].header.column
+    values = [None] * (cells[-1].header.column - col_first + 1)
+    for cell in cells:
+        if isinstance(cell, SharedStringCell):
+            values[cell.header.column - col_first] = shared_strings[cell.str_index].val
+        else:
+            values[cell.header.column - col_first] = cell.value
+    return row.header.row_index, col_first, values
+
+def row_styles(row, stylesheet):
+    cells = row.cells
+    if not cells:
+        return row.header.row_index, 0, []
+    
+    col_first = cells[0].header.column
+    styles = [None] * (cells[-1].header.column - col_first + 1)
+    for cell in cells:
+        styles[cell.header.column - col_first] = stylesheet.cell_style(cell.header.style_index)
+    return row.header.row_index, col_first, styles
+
+def row_projection(row, col_first, col_last, shared_strings=None):
+    values = [None] * (col_last - col_first + 1)
+    for cell in row.cells:
+        column = cell.header.column
+        if column < col_first:
+            continue
+        if column > col_last:
+            break
+        if isinstance(cell, SharedStringCell):
+            values[column - col_first] = shared_strings[cell.str_index].val
+        else:
+            values[column - col_first] = cell.value
+    return row.header.row_index, values
+
+def read_workbook_sheets(pkg):
+    wb_info = pkg.get_part_info(pkg.get_part_info().get_rel('Type', RelationshipType.WORKBOOK))
+    with pkg.open_part(wb_info) as f:
+        wb = WorkbookPart.read(f)
+    
+    sheets = []
+    for sheet_ref in wb.sheet_refs:
+        rel = wb_info.get_rel('Id', sheet_ref.rel_id)
+        if rel and rel.rtype == RelationshipType.WORKSHEET:
+            sheets.append((sheet_ref.sheet_name, norm_path(rel)))
+    
+    shared_strings = None
+    sst_rel = wb_info.get_rel('Type', RelationshipType.SHARED_STRINGS)
+    if sst_rel:
+        with pkg.open_part(sst_rel) as f:
+            shared_strings = SharedStringTable.read(f)
+    
+    return sheets, shared_strings
+
+def read_sheet_list(fname):
+    # Metadata only: two relationship parts and the head of the workbook part, all through one archive handle.
+    with ZipFile(fname) as zf:
+        pkg_rels = PartRelationshipsPart.read_zip(zf)
+        wb_rel = pkg_rels.get_rel('Type', RelationshipType.WORKBOOK) if pkg_rels else None
+        if not wb_rel:
+            raise ValueError(f'Package has no workbook part: {fname}')
+        
+        wb_path = norm_path(wb_rel.target)
+        wb_rels = PartRelationshipsPart.read_zip(zf, wb_path)
+        with zf.open(norm_path(wb_path, leading_slash=False)) as f:
+            props, sheet_refs = WorkbookPart.read_sheet_refs(f)
+    
+    sheets = []
+    for sheet_ref in sheet_refs:
+        rel = wb_rels.get_rel('Id', sheet_ref.rel_id) if wb_rels else None
+        sheets.append((sheet_ref.sheet_name, sheet_ref.hidden_state, rel.rtype if rel else None, norm_path(rel.target) if rel else None))
+    return sheets
+
+def _read_sheet_list(fname):
+    try:
+        return fname, read_sheet_list(fname), None
+    except Exception as e:
+        # One unreadable package must not abort the rest of the batch
+        return fname, None, f'{type(e).__name__}: {e}'
+
+def iter_sheet_lists(fnames, workers=None, chunksize=16):
+    if workers == 1:
+        for fname in fnames:
+            yield _read_sheet_list(fname)
+        return
+    
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(_read_sheet_list, fnames, chunksize=chunksize)
+
+def read_workbook_theme(pkg):
+    wb_info = pkg.get_part_info(pkg.get_part_info().get_rel('Type', RelationshipType.WORKBOOK))
+    theme_rel = wb_info.get_rel('Type', RelationshipType.THEME)
+    if not theme_rel:
+        return None
+    with pkg.open_part(theme_rel) as f:
+        return ThemePart.read(f)
+
+def seek_row(rprocessor, sheet_path, row_first, index=None):
+    # Positions a reader past the preamble at the first row at or after row_first; rows before it are passed over by
+    # header alone (or not read at all with a package index) without decoding their cells.
+    if index:
+        found = index.find_row(sheet_path, row_first)
+        if found is None:
+            return False
+        offset, state = found
+        rprocessor.stream.seek(offset)
+        rprocessor.restore_state(state)
+        return True
+    
+    for offset, r in rprocessor.scan(BinaryRecordType.BrtRowHdr, BinaryRecordType.BrtEndSheetData):
+        if r.rtype == BinaryRecordType.BrtEndSheetData:
+            return False
+        if struct.unpack('<i', rprocessor.read(4))[0] >= row_first:
+            rprocessor.stream.seek(offset)
+            return True
+    return False
+
+def iter_area_rows(pkg, sheet_path, row_first, row_last, col_first, col_last, shared_strings=None, index=None):
+    with pkg.open_part(sheet_path) as f:
+        rprocessor = RecordProcessor(f)
+        sheet_dimension, col_info = WorksheetPart.read_preamble(rprocessor)
+        
+        # Whole-row and whole-column ranges stop at the used range rather than the grid edge
+        if sheet_dimension:
+            row_last = min(row_last, sheet_dimension.row_last)
+            col_last = min(col_last, sheet_dimension.col_last)
+        if row_first > row_last or col_first > col_last:
+            return
+        
+        if not seek_row(rprocessor, sheet_path, row_first, index):
+            return
+        
+        for row in WorksheetPart.iter_rows(rprocessor):
+            if row.header.row_index > row_last:
+                break
+            yield row_projection(row, col_first, col_last, shared_strings)
+
+def read_named_range(fname, name, sheet=None, index=None):
+    with ZipOfficeOpenXMLPackage(fname) as pkg:
+        wb_info = pkg.get_part_info(pkg.get_part_info().get_rel('Type', RelationshipType.WORKBOOK))
+        with pkg.open_part(wb_info) as f:
+            wb = WorkbookPart.read(f)
+        
+        sheet_ref, area = wb.resolve_name(name, sheet)
+        rel = wb_info.get_rel('Id', sheet_ref.rel_id)
+        if not rel or rel.rtype != RelationshipType.WORKSHEET:
+            raise ValueError(f'Defined name does not refer to a worksheet: {name}')
+        
+        shared_strings = None
+        sst_rel = wb_info.get_rel('Type', RelationshipType.SHARED_STRINGS)
+        if sst_rel:
+            with pkg.open_part(sst_rel) as f:
+                shared_strings = SharedStringTable.read(f)
+        
+        return list(iter_area_rows(pkg, norm_path(rel), area.row_first, area.row_last, area.col_first, area.col_last, shared_strings, index))
+
+def iter_sheet_rows(pkg, sheet_path, shared_strings=None, row_first=0, index=None):
+    with pkg.open_part(sheet_path) as f:
+        rprocessor = RecordProcessor(f)
+        WorksheetPart.read_preamble(rprocessor)
+        if row_first and not seek_row(rprocessor, sheet_path, row_first, index):
+            return
+        for row in WorksheetPart.iter_rows(rprocessor):
+            yield row_values(row, shared_strings)
+
+
+_worker_shared_strings = None
+
+def _init_worker(sst_handle):
+    global _worker_shared_strings
+    if sst_handle:
+        _worker_shared_strings = SharedStringTable.attach(sst_handle)
+        # Workers exit through multiprocessing's exit hooks rather than atexit
+        Finalize(_worker_shared_strings, _worker_shared_strings.close, exitpriority=10)
+
+def _read_sheet(fname, sheet_path):
+    with ZipOfficeOpenXMLPackage(fname) as pkg:
+        return list(iter_sheet_rows(pkg, sheet_path, _worker_shared_strings))
+
+def _read_rows_chunk(chunk, read_stack):
+    rprocessor = RecordProcessor(io.BytesIO(chunk))
+    rprocessor.read_stack.extend(read_stack)
+    return [row_values(row, _worker_shared_strings) for row in WorksheetPart.iter_rows(rprocessor)]
+
+def iter_workbook(fname, workers=None, ordered=False):
+    with ZipOfficeOpenXMLPackage(fname) as pkg:
+        sheets, shared_strings = read_workbook_sheets(pkg)
+        
+        # Prefetching only helps the single-worker path; worker processes each open the package and read their own sheet.
+        if workers == 1:
+            pkg.prefetch([sheet_path for sheet_name, sheet_path in sheets])
+            for sheet_name, sheet_path in sheets:
+                yield sheet_name, list(iter_sheet_rows(pkg, sheet_path, shared_strings))
+            return
+    
+    shared = shared_strings.share() if shared_strings else None
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.handle if shared else None,)) as executor:
+            futures = dict((executor.submit(_read_sheet, fname, sheet_path), sheet_name) for sheet_name, sheet_path in sheets)
+            for future in (futures if ordered else as_completed(futures)):
+                yield futures[future], future.result()
+    finally:
+        if shared:
+            shared.close()
+
+def read_workbook(fname, workers=None):
+    return dict(iter_workbook(fname, workers, True))
+
+def read_sheet(fname, sheet_name, workers=None, chunks=None):
+    with ZipOfficeOpenXMLPackage(fname) as pkg:
+        sheets, shared_strings = read_workbook_sheets(pkg)
+        
+        for name, sheet_path in sheets:
+            if name == sheet_name:
+                break
+        else:
+            raise ValueError(f'No worksheet named {sheet_name}')
+        
+        with pkg.open_part(sheet_path) as f:
+            data = f.read()
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    
+    split = WorksheetPart.split_rows(data, chunks if chunks else workers)
+    del data
+    
+    rows = []
+    if workers == 1:
+        for chunk, read_stack in split:
+            rprocessor = RecordProcessor(io.BytesIO(chunk))
+            rprocessor.read_stack.extend(read_stack)
+            rows.extend(row_values(row, shared_strings) for row in WorksheetPart.iter_rows(rprocessor))
+        return rows
+    
+    shared = shared_strings.share() if shared_strings else None
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(shared.handle if shared else None,)) as executor:
+            for chunk_rows in executor.map(_read_rows_chunk, *zip(*split)):
+                rows.extend(chunk_rows)
+    finally:
+        if shared:
+            shared.close()
+    return rows
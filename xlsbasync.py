@@ -0,0 +1,104 @@
+
+import asyncio
+from itertools import islice
+
+from ooxmlpkg import ZipOfficeOpenXMLPackage
+from xlsb import read_workbook_sheets, iter_sheet_rows
+
+
+def next_batch(itr, batch_size):
+    return list(islice(itr, batch_size))
+
+def close_iterator(itr, pending=None):
+    # A cancelled batch may still be running on the executor; close the zip handle once it returns.
+    if pending is not None and not pending.done():
+        def close(f):
+            if not f.cancelled():
+                f.exception()
+            itr.close()
+        pending.add_done_callback(close)
+    else:
+        itr.close()
+
+
+class AsyncWorkbook:
+    @staticmethod
+    async def open(fname, executor=None):
+        loop = asyncio.get_running_loop()
+        pkg = await loop.run_in_executor(executor, ZipOfficeOpenXMLPackage, fname)
+        try:
+            sheets, shared_strings = await loop.run_in_executor(executor, read_workbook_sheets, pkg)
+        except BaseException:
+            pkg.close()
+            raise
+        return AsyncWorkbook(pkg, sheets, shared_strings, executor)
+    
+    def __init__(self, pkg, sheets, shared_strings, executor=None):
+        self.pkg = pkg
+        self.sheets = dict(sheets)
+        self.shared_strings = shared_strings
+        self.executor = executor
+        self.open_iterators = {}
+    
+    @property
+    def sheet_names(self):
+        return list(self.sheets)
+    
+    def sheet(self, sheet_name):
+        try:
+            return AsyncSheet(self, sheet_name, self.sheets[sheet_name])
+        except KeyError:
+            raise ValueError(f'No worksheet named {sheet_name}')
+    
+    async def read_part(self, path, reader):
+        def read():
+            with self.pkg.open_part(path) as f:
+                return reader(f)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, read)
+    
+    async def close(self):
+        open_iterators = self.open_iterators
+        while open_iterators:
+            close_iterator(*open_iterators.popitem())
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.pkg.close)
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+
+class AsyncSheet:
+    def __init__(self, workbook, sheet_name, path):
+        self.workbook = workbook
+        self.sheet_name = sheet_name
+        self.path = path
+    
+    async def rows(self, batch_size=1000):
+        batches = self.batches(batch_size)
+        try:
+            async for batch in batches:
+                for row in batch:
+                    yield row
+        finally:
+            await batches.aclose()
+    
+    async def batches(self, batch_size=1000):
+        workbook = self.workbook
+        loop = asyncio.get_running_loop()
+        
+        itr = iter_sheet_rows(workbook.pkg, self.path, workbook.shared_strings)
+        open_iterators = workbook.open_iterators
+        open_iterators[itr] = pending = None
+        try:
+            while True:
+                open_iterators[itr] = pending = loop.run_in_executor(workbook.executor, next_batch, itr, batch_size)
+                # Shielded so cancellation leaves pending tracking the worker thread rather than completing at once.
+                batch = await asyncio.shield(pending)
+                if not batch:
+                    break
+                yield batch
+        finally:
+            if itr in open_iterators:
+                close_iterator(itr, open_iterators.pop(itr))